@@ -0,0 +1,109 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from deliveroo_crawler.next_data import extract_bytes
+
+try:
+    import zstandard
+except ImportError:  # Only needed when an archive is actually used
+    zstandard = None
+
+
+class PageArchive:
+    """
+    Content-addressed, zstd-compressed store of fetched pages with an index by URL and fetch time.
+
+    Blobs live under ``<root>/objects/<2 hex>/<sha256>.zst`` so identical pages are stored once;
+    ``<root>/index.db`` records every fetch. With ``next_data_only`` only the ``__NEXT_DATA__``
+    script is kept, wrapped in a minimal page so replay goes through the same extraction.
+    """
+
+    def __init__(self, root: str, next_data_only: bool = False, level: int = 10) -> None:
+        if zstandard is None:
+            raise ImportError("PageArchive needs the 'zstandard' package (pip install zstandard)")
+
+        self.root = Path(root)
+        self.next_data_only = next_data_only
+        self.level = level
+        self.__objects = self.root / 'objects'
+        self.__objects.mkdir(parents=True, exist_ok=True)
+        self.__local = threading.local()
+
+        with self.__connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS pages (
+                                url TEXT,
+                                fetched_at REAL,
+                                digest TEXT,
+                                size INTEGER
+                            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS pages_url_fetched_at ON pages (url, fetched_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at)')
+
+    def __connection(self) -> sqlite3.Connection:
+        if not hasattr(self.__local, 'conn'):
+            self.__local.conn = sqlite3.connect(self.root / 'index.db', timeout=30)
+        return self.__local.conn
+
+    def __path(self, digest: str) -> Path:
+        return self.__objects / digest[:2] / f'{digest}.zst'
+
+    @staticmethod
+    def next_data_page(content: bytes) -> bytes:
+        next_data = extract_bytes(content)
+        if next_data is None:
+            return content
+        return b'<html><body><script id="__NEXT_DATA__" type="application/json">' + next_data + \
+            b'</script></body></html>'
+
+    def put(self, url: str, content: bytes, fetched_at: float = None) -> str:
+        """
+        Store a fetched page.
+
+        :return: sha256 hex digest the page is stored under
+        """
+        if self.next_data_only:
+            content = self.next_data_page(content)
+        digest = hashlib.sha256(content).hexdigest()
+
+        blob = self.__path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(exist_ok=True)
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(content)
+            # Write then rename so a crash never leaves a truncated blob behind
+            fd, tmp = tempfile.mkstemp(dir=blob.parent)
+            with os.fdopen(fd, 'wb') as file:
+                file.write(compressed)
+            os.replace(tmp, blob)
+
+        with self.__connection() as conn:
+            conn.execute('INSERT INTO pages (url, fetched_at, digest, size) VALUES (?, ?, ?, ?)',
+                         (url, time.time() if fetched_at is None else fetched_at, digest, len(content)))
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return zstandard.ZstdDecompressor().decompress(self.__path(digest).read_bytes())
+
+    def iter_pages(self, since: float = None, until: float = None, latest: bool = True):
+        """
+        Yield ``(url, fetched_at, content)`` for archived fetches in ``[since, until]``.
+
+        :param since: Earliest fetch time (unix seconds), unbounded if None
+        :param until: Latest fetch time (unix seconds), unbounded if None
+        :param latest: Only the most recent fetch of each URL within the window
+        """
+        where = 'WHERE fetched_at >= ? AND fetched_at <= ?'
+        params = (since if since is not None else float('-inf'), until if until is not None else float('inf'))
+        if latest:
+            query = f'''SELECT url, MAX(fetched_at), digest FROM pages {where} GROUP BY url ORDER BY url'''
+        else:
+            query = f'SELECT url, fetched_at, digest FROM pages {where} ORDER BY fetched_at'
+
+        # Read the index up front, the caller may take a while per page
+        rows = self.__connection().execute(query, params).fetchall()
+        for url, fetched_at, digest in rows:
+            yield url, fetched_at, self.get(digest)
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+
+import aiohttp
+
+from deliveroo_crawler.retry import FetchError, HostCircuitBreakers, RetryPolicy, parse_retry_after
+from deliveroo_crawler.transport import HEADERS
+
+# Errors worth another attempt, next to the statuses listed in the RetryPolicy
+RETRY_EXCEPTIONS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+
+async def _fetch(session, url, retry_policy, circuit_breakers, rate_limiter):
+    breaker = circuit_breakers.breaker(url)
+    for attempt in range(1, retry_policy.attempts + 1):
+        await breaker.wait_async()
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async(url)
+
+        retry_after = None
+        try:
+            async with session.get(url, allow_redirects=True) as raw:
+                if raw.status == 200:
+                    content = await raw.read()
+                    breaker.record_success()
+                    return content
+                error = FetchError(url, raw.status, raw.reason)
+                if raw.status not in retry_policy.statuses:
+                    raise error
+                retry_after = parse_retry_after(raw.headers.get('retry-after'))
+        except RETRY_EXCEPTIONS as e:
+            error = FetchError(url, None, type(e).__name__)
+
+        breaker.record_failure()
+        if attempt < retry_policy.attempts:
+            await asyncio.sleep(retry_policy.delay(attempt, retry_after))
+
+    raise error
+
+
+async def _worker(session, queue, handler, failed_urls, unstarted_urls, retry_policy, circuit_breakers, rate_limiter,
+                  stop):
+    loop = asyncio.get_running_loop()
+    while True:
+        url = await queue.get()
+        if stop is not None and stop.is_set():
+            # Left for the caller to hand back, the queue still has to be emptied for crawl() to return
+            unstarted_urls.append(url)
+            queue.task_done()
+            continue
+        try:
+            content = await _fetch(session, url, retry_policy, circuit_breakers, rate_limiter)
+            # Extraction and DB writes are blocking, keep them off the event loop
+            await loop.run_in_executor(None, handler, url, content)
+        except FetchError as e:
+            logging.error(str(e))
+            failed_urls.append(url)
+        except Exception as e:
+            logging.error(f"Failed to scrape {url}: {e!r}")
+            failed_urls.append(url)
+        finally:
+            queue.task_done()
+
+
+async def crawl(urls, handler, max_in_flight: int = 1000, limit_per_host: int = 0,
+                timeout: float = 30.0, rate_limiter=None, retry_policy=None, circuit_breakers=None,
+                stop=None) -> tuple:
+    """
+    Fetch every URL on a single event loop and hand the raw page to ``handler``.
+
+    :param urls: Iterable of URLs to fetch
+    :param handler: Blocking callable ``handler(url, content)`` run in the default executor
+    :param max_in_flight: Maximum number of requests in flight at any time
+    :param limit_per_host: Per-host connection cap of the shared pool (0 means no cap)
+    :param timeout: Total timeout per request in seconds
+    :param rate_limiter: Optional :class:`~deliveroo_crawler.rate_limit.HostRateLimiter` awaited before each request
+    :param retry_policy: :class:`~deliveroo_crawler.retry.RetryPolicy` for transient failures
+    :param circuit_breakers: :class:`~deliveroo_crawler.retry.HostCircuitBreakers` pausing a host during an outage
+    :param stop: Optional :class:`threading.Event`; once set, workers finish the URLs they hold and take no more
+    :return: ``(failed_urls, unstarted_urls)``, the URLs that could not be fetched or handled and those
+        never started because of ``stop``
+    """
+    queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+
+    failed_urls = []
+    unstarted_urls = []
+    retry_policy = retry_policy or RetryPolicy()
+    circuit_breakers = circuit_breakers or HostCircuitBreakers()
+    connector = aiohttp.TCPConnector(limit=max_in_flight, limit_per_host=limit_per_host)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        workers = [asyncio.create_task(_worker(session, queue, handler, failed_urls, unstarted_urls, retry_policy,
+                                               circuit_breakers, rate_limiter, stop))
+                   for _ in range(min(max_in_flight, queue.qsize()))]
+        await queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    return failed_urls, unstarted_urls
+
+
+def run(urls, handler, **kwargs):
+    """Synchronous entry point for :func:`crawl`."""
+    return asyncio.run(crawl(urls, handler, **kwargs))
@@ -0,0 +1,74 @@
+"""
+Compare the __NEXT_DATA__ extraction backends on saved menu pages.
+
+    python -m deliveroo_crawler.bench_next_data fixtures/*.html
+    python -m deliveroo_crawler.bench_next_data --archive page_archive --limit 200
+"""
+import argparse
+import time
+from json import loads
+from pathlib import Path
+
+from deliveroo_crawler.next_data import BACKENDS
+
+
+def load_pages(paths: list, archive_dir: str = None, limit: int = None) -> list:
+    pages = [Path(p).read_bytes() for p in paths]
+    if archive_dir:
+        # Only needs zstandard when reading from an archive
+        from deliveroo_crawler.archive import PageArchive
+        for _, _, content in PageArchive(archive_dir).iter_pages():
+            pages.append(content)
+            if limit and len(pages) >= limit:
+                break
+    return pages[:limit] if limit else pages
+
+
+def bench(pages: list, repeat: int = 3) -> dict:
+    """:return: ``{backend: best seconds per page over repeat runs}``"""
+    results = {}
+    for name, extract in BACKENDS.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for content in pages:
+                extract(content)
+            best = min(best, time.perf_counter() - start)
+        results[name] = best / len(pages)
+    return results
+
+
+def check(pages: list) -> int:
+    """Number of pages where the backends disagree on the decoded payload."""
+    mismatches = 0
+    for content in pages:
+        payloads = [extract(content) for extract in BACKENDS.values()]
+        decoded = [loads(payload) if payload is not None else None for payload in payloads]
+        if any(d != decoded[0] for d in decoded[1:]):
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', help='Saved HTML pages')
+    parser.add_argument('--archive', help='PageArchive directory to read the latest pages from')
+    parser.add_argument('--limit', type=int, help='Maximum number of pages')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per backend, the best one is reported')
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages, args.archive, args.limit)
+    if not pages:
+        parser.error('no pages given')
+
+    size = sum(len(content) for content in pages) / len(pages)
+    print(f"{len(pages)} pages, {size / 1024:.0f} KiB on average")
+    results = bench(pages, args.repeat)
+    baseline = results['bs4']
+    for name, seconds in results.items():
+        print(f"{name:>6}: {seconds * 1000:8.2f} ms/page  ({baseline / seconds:6.1f}x bs4)")
+    print(f"payload mismatches: {check(pages)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import logging
+import threading
+from collections import deque
+
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease limit on the number of concurrent fetches.
+
+    Workers hold a slot (``with controller:``) while they fetch. Every response is
+    reported through :meth:`record`; after a full round of healthy responses the limit
+    grows by ``increase``, while a 429, a 5xx, a connection error or a p95 latency
+    well above the best p95 seen so far shrinks it by ``decrease``.
+    """
+
+    def __init__(self, initial: int = 5, minimum: int = 1, maximum: int = 100, increase: int = 1,
+                 decrease: float = 0.5, window: int = 50, latency_factor: float = 2.0) -> None:
+        """
+        :param initial: Concurrency level to start from
+        :param minimum: Lowest level the controller backs off to
+        :param maximum: Highest level the controller ramps up to
+        :param increase: Slots added after a healthy round
+        :param decrease: Factor the level is multiplied by on back-off
+        :param window: Number of recent latencies the p95 is computed over
+        :param latency_factor: Back off when p95 exceeds the baseline p95 by this factor
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+
+        self.__limit = min(max(initial, minimum), maximum)
+        self.__in_flight = 0
+        self.__latencies = deque(maxlen=window)
+        self.__baseline = None
+        self.__since_change = 0
+        self.__backed_off = False
+        self.__condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Live concurrency level."""
+        return self.__limit
+
+    @property
+    def in_flight(self) -> int:
+        return self.__in_flight
+
+    def acquire(self) -> None:
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__in_flight < self.__limit)
+            self.__in_flight += 1
+
+    def release(self) -> None:
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__condition.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def p95(self) -> float | None:
+        if not self.__latencies:
+            return None
+        latencies = sorted(self.__latencies)
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def record(self, url: str, status_code: int | None, elapsed: float) -> None:
+        """
+        Feed one response into the controller.
+
+        :param url: URL that was requested
+        :param status_code: HTTP status, or None if the request raised
+        :param elapsed: Request latency in seconds
+        """
+        with self.__condition:
+            self.__since_change += 1
+            if status_code is None or status_code == 429 or status_code >= 500:
+                self.__back_off(f"{url} returned {status_code}")
+                return
+
+            self.__latencies.append(elapsed)
+            if len(self.__latencies) < self.__latencies.maxlen:
+                return
+
+            p95 = self.p95()
+            if self.__baseline is None or p95 < self.__baseline:
+                self.__baseline = p95
+
+            if p95 > self.__baseline * self.latency_factor:
+                self.__back_off(f"p95 latency {p95:.2f}s over baseline {self.__baseline:.2f}s")
+            elif self.__since_change >= self.__limit:
+                # One full round of healthy responses at the current level
+                self.__backed_off = False
+                self.__set_limit(self.__limit + self.increase)
+
+    def __back_off(self, reason: str) -> None:
+        # Back off at most once per round so a burst of errors counts as one signal
+        if self.__backed_off and self.__since_change < self.__limit:
+            return
+        self.__backed_off = True
+        if self.__set_limit(int(self.__limit * self.decrease)):
+            self.__latencies.clear()
+            logging.warning(f"Concurrency reduced to {self.__limit}: {reason}")
+
+    def __set_limit(self, limit: int) -> bool:
+        limit = min(max(limit, self.minimum), self.maximum)
+        self.__since_change = 0
+        if limit == self.__limit:
+            return False
+        self.__limit = limit
+        self.__condition.notify_all()
+        logging.info(f"Concurrency set to {limit}")
+        return True
@@ -8,13 +8,82 @@ from pathlib import Path
 import csv
 import os
 import validators
-from bs4 import BeautifulSoup
 from pandas import DataFrame, read_csv, concat
-from requests import get, HTTPError
+from requests import HTTPError
+from deliveroo_crawler.next_data import MenuItemStream, decode_menu_header, decode_menu_meta, extract_next_data
+from deliveroo_crawler.output_store import OutputStore, RestaurantRows
+from deliveroo_crawler.schema import MENU_ITEM_FIELDS, RESTAURANT_FIELDS, Schema
+from deliveroo_crawler.transport import get_transport
 
 logging.basicConfig(format="%(asctime)s - [%(levelname)s]\t%(message)s",
                     datefmt='%d-%b-%y %H:%M:%S')
 
+# Parse menu items incrementally each time they are written instead of decoding them up front
+STREAM_MENU_ITEMS = False
+
+# Fields written to the CSVs, compiled once into accessors; missing values are written empty
+restaurant_schema = Schema(RESTAURANT_FIELDS)
+menu_item_schema = Schema(MENU_ITEM_FIELDS).project(('name', 'description', 'price', 'nutritional_info', 'image_url'))
+
+# Columns of the location CSV, in header order
+LOCATION_COLUMNS = ('name', 'address', 'lat', 'lon', 'city', 'neighborhood', 'postcode', 'cityId', 'zoneId', 'geohash')
+
+LOCATION_HEADER = ['Name', 'Address', 'Latitude', 'Longitude', 'City', 'Neighborhood', 'Postcode', 'City ID',
+                   'Zone ID', 'Geohash']
+MENU_HEADER = ['Item Name', 'Item Description', 'Item Price', 'Item Nutritional Info', 'Item Image']
+CALORIES_HEADER = ['Item Name', 'Item Description', 'Item Nutritional Info', 'Price', 'Img']
+
+# Write buffer of each open CSV file, in bytes
+CSV_BUFFER_SIZE = 1 << 16
+
+# Output directories this process has already made sure exist
+_created_directories = set()
+
+
+class CsvSink:
+    """
+    One output CSV, kept open with a write buffer while the rows of a restaurant go in.
+
+    :param filename: File to (over)write
+    :param header: First row
+    :param lazy: Only create the file once a row is written, so a table with no rows leaves no file
+    """
+
+    def __init__(self, filename: str, header: list, lazy: bool = False) -> None:
+        self.filename = filename
+        self.header = header
+        self.__file = None
+        self.__writer = None
+        if not lazy:
+            self.__open()
+
+    def __open(self) -> None:
+        try:
+            self.__file = open(self.filename, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE)
+        except FileNotFoundError:
+            # Removed since DeliverooCrawler.create_directory made it
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            self.__file = open(self.filename, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE)
+        self.__writer = csv.writer(self.__file)
+        self.__writer.writerow(self.header)
+
+    def writerow(self, row: list) -> None:
+        if self.__writer is None:
+            self.__open()
+        self.__writer.writerow(row)
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+            self.__writer = None
+
+    def __enter__(self) -> 'CsvSink':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
 
 class DeliverooCrawler:
     @staticmethod
@@ -32,7 +101,7 @@ class DeliverooCrawler:
 
 
     def __init__(self, url: str, f_name: str, end_dir: str = '', menu_dir: str = 'menus',
-                 cal_dir: str = 'items_descr_cal') -> None:
+                 cal_dir: str = 'items_descr_cal', store: OutputStore = None) -> None:
         """
         :rtype: None
         :param url: URL for data crawl
@@ -40,27 +109,22 @@ class DeliverooCrawler:
         # :param end_dir: Subdirectory name within f_name
         # :param menu_dir: Directory to save menus
         # :param cal_dir: Directory to save calories data
+        :param store: Append to the consolidated table files of this store instead of writing one CSV per restaurant
         """
         self.__flag = True
-        self.__details_json = None
-        self.__bs4_data = None
+        self.__menu_meta = None
+        self.__next_data = None
         self.__restaurant_name = None
         self.__restaurant = {}
         self.__restaurant_location = {}
         self.__restaurant_menu_details = []
 
-        self.__filename = f_name
+        self.__menu_dir_name = menu_dir
+        self.__cal_dir_name = cal_dir
+        self.store = store
 
         self.url = url
-        self.base_dir = os.path.join(f_name, end_dir)
-        self.end_dir_location = os.path.join(f_name, end_dir, "location")
-        self.menu_dir = os.path.join(f_name, end_dir, menu_dir)
-        self.cal_dir = os.path.join(f_name, end_dir, cal_dir)
-
-        self.create_directory(self.base_dir)
-        self.create_directory(self.end_dir_location)
-        self.create_directory(self.menu_dir)
-        self.create_directory(self.cal_dir)
+        self.set_output_dir(f_name, end_dir)
         try:
             if self.url_validator(url):
                 self.url = url
@@ -82,8 +146,32 @@ class DeliverooCrawler:
         if self.__flag:
             self.__fetch_details()
 
+    def set_output_dir(self, f_name: str, end_dir: str = '') -> None:
+        """
+        Point the CSV output at another directory, e.g. the next borough listing the same restaurant.
+
+        :param f_name: Directory to save data
+        :param end_dir: Subdirectory name within f_name
+        """
+        self.__filename = f_name
+        self.base_dir = os.path.join(f_name, end_dir)
+        self.end_dir_location = os.path.join(f_name, end_dir, "location")
+        self.menu_dir = os.path.join(f_name, end_dir, self.__menu_dir_name)
+        self.cal_dir = os.path.join(f_name, end_dir, self.__cal_dir_name)
+
+        if self.store is not None:
+            # The store creates base_dir itself, with no per-table subdirectories
+            return
+        self.create_directory(self.base_dir)
+        self.create_directory(self.end_dir_location)
+        self.create_directory(self.menu_dir)
+        self.create_directory(self.cal_dir)
+
     @staticmethod
     def create_directory(directory):
+        if directory in _created_directories:
+            return
+        _created_directories.add(directory)
         try:
             os.makedirs(directory)
             print(f"Directory '{directory}' created successfully.")
@@ -93,12 +181,7 @@ class DeliverooCrawler:
 
     def __fetch_details(self):
         # try:
-        raw = get(self.url, allow_redirects=True, headers=(
-            {
-                'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                              '(KHTML, like Gecko) Chrome/102.0.5005.63 Safari/537.36',
-            }
-        ))
+        raw = get_transport().get(self.url, allow_redirects=True)
 
         status_code = raw.status_code
         reason = raw.reason
@@ -106,7 +189,7 @@ class DeliverooCrawler:
         if status_code != 200:
             raise HTTPError(status_code, reason)
 
-        self.__bs4_data = BeautifulSoup(raw.content, 'lxml')
+        self.__next_data = extract_next_data(raw.content)
 
         # call other function(s)
         if self.__flag:
@@ -114,8 +197,12 @@ class DeliverooCrawler:
     def __make_json(self):
         # try:
         #     try:
-        data = self.__bs4_data.select('#__NEXT_DATA__')[0].text
-        self.__details_json = loads(data)
+        if STREAM_MENU_ITEMS:
+            # Keep the payload, the items are streamed out of it by __fetch_restaurant_menu_details
+            self.__menu_meta = decode_menu_header(self.__next_data)
+        else:
+            self.__menu_meta = decode_menu_meta(self.__next_data)
+            self.__next_data = None
 
         # call other function(s)
         if self.__flag:
@@ -123,9 +210,10 @@ class DeliverooCrawler:
 
     def __fetch_restaurant_details(self):
         try:
-            self.__restaurant = self.__details_json['props']['initialState']['menuPage']['menu']['meta']['restaurant']
-            self.__restaurant_name = self.__restaurant['name']
-            self.__restaurant_address = self.__restaurant['location']['address']['address1']
+            self.__restaurant = self.__menu_meta['restaurant']
+            self.__details = restaurant_schema(self.__menu_meta)
+            self.__restaurant_name = self.__details['name']
+            self.__restaurant_address = self.__details['address']
 
             self.__name_address = {
                 'name': self.__restaurant_name,
@@ -139,15 +227,8 @@ class DeliverooCrawler:
             pass
     def __fetch_restaurant_location(self):
         # try:
-        self.__restaurant_location = self.__details_json['props']['initialState']['menuPage']['menu']['meta']['customerLocation']
-        self.__lat = self.__restaurant_location['lat']
-        self.__lon = self.__restaurant_location['lon']
-        self.__city = self.__restaurant_location['city']
-        self.__neighborhood = self.__restaurant_location['neighborhood']
-        self.__postcode = self.__restaurant_location['postcode']
-        self.__cityId = self.__restaurant_location['cityId']
-        self.__zoneId = self.__restaurant_location['zoneId']
-        self.__geohash = self.__restaurant_location['geohash']
+        # The location fields themselves were extracted with the restaurant ones
+        self.__restaurant_location = self.__menu_meta['customerLocation']
 
         if self.__flag:
             self.__fetch_restaurant_menu_details()
@@ -155,9 +236,12 @@ class DeliverooCrawler:
     def __fetch_restaurant_menu_details(self):
 
         # try:
-        self.__menu = self.__details_json['props']['initialState']['menuPage']['menu']['meta']['items']
+        if STREAM_MENU_ITEMS:
+            self.__menu = MenuItemStream(self.__next_data)
+        else:
+            self.__menu = self.__menu_meta['items']
 
-        if len(self.__menu) < 1:
+        if next(iter(self.__menu), None) is None:
             self.__flag = False
             return
     def get_restaurant_name_address(self) -> None | DataFrame:
@@ -189,68 +273,43 @@ class DeliverooCrawler:
             logging.error(f'Cannot write into csv')
 
 
+    def __open_sink(self, table_dir: str, header: list, lazy: bool = False) -> CsvSink | RestaurantRows:
+        if self.store is not None:
+            # e.g. <borough>/menus.csv, with the restaurant's file name as first column
+            return self.store.rows(self.base_dir, os.path.basename(table_dir), header, self.__converted_filepath)
+        return CsvSink(os.path.join(table_dir, self.__converted_filepath + '.csv'), header, lazy)
+
     def __write_restaurant_name_address_location(self):
         #self.create_directory(self.end_dir_location)
         filename = os.path.join(self.end_dir_location, self.__converted_filepath + '.csv')
 
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow(
-                    ['Name', 'Address', 'Latitude', 'Longitude', 'City', 'Neighborhood', 'Postcode', 'City ID',
-                     'Zone ID', 'Geohash'])
-                writer.writerow(
-                    [self.__restaurant_name, self.__restaurant_address, self.__lat, self.__lon, self.__city, self.__neighborhood, self.__postcode, self.__cityId, self.__zoneId,
-                     self.__geohash])
-            self.__write_restaurant_menu()
+            with self.__open_sink(self.end_dir_location, LOCATION_HEADER) as location:
+                location.writerow([self.__details[column] for column in LOCATION_COLUMNS])
+                self.__write_restaurant_menu()
         except:
             print(f'{filename} not written to file')
 
     def __write_restaurant_menu(self):
-        #makedirs(self.menu_dir, exist_ok=True)
-        filename = os.path.join(self.menu_dir, self.__converted_filepath + '.csv')
-        with open(filename, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Item Name', 'Item Description', 'Item Price', 'Item Nutritional Info', 'Item Image'])
-
-            for item in self.__menu:
-                item_description = None
-                if 'description' in item and item['description'] is not None:
-                    item_description = item['description']
-
-                self.__nutritional_info = None
-                if 'nutritionalInfo' in item and item['nutritionalInfo'] is not None:
-                    self.__nutritional_info = item['nutritionalInfo']['energyFormatted']
-
-                    # Write calories labels to file
-                    self.__write_cal_to_csv()
-
-                row = [
-                    item['name'],
-                    item_description,
-                    item['price']['formatted'],
-                    self.__nutritional_info,
-                    item['image']['url'] if 'image' in item and item['image'] is not None else None
-                ]
-                writer.writerow(row)
-
-    def __write_cal_to_csv(self):
-        #makedirs(self.cal_dir, exist_ok=True)
-        filename = os.path.join(self.cal_dir, self.__converted_filepath + '.csv')
-        with open(filename, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Item Name', 'Item Description', 'Item Nutritional Info', 'Price', 'Img'])
+        # One pass over the items feeds the menu CSV and, for items with calories, the calories CSV
+        with self.__open_sink(self.menu_dir, MENU_HEADER) as menu, \
+                self.__open_sink(self.cal_dir, CALORIES_HEADER, lazy=True) as calories:
             for item in self.__menu:
-                if 'nutritionalInfo' in item and item['nutritionalInfo'] is not None:
-                    nutritional_info = item['nutritionalInfo']['energyFormatted']
-
-                    row = [
-                        item['name'],
-                        item['description'],
+                fields = menu_item_schema(item)
+                nutritional_info = fields['nutritional_info']
+
+                menu.writerow([
+                    fields['name'],
+                    fields['description'],
+                    fields['price'],
+                    nutritional_info,
+                    fields['image_url']
+                ])
+                if nutritional_info is not None:
+                    calories.writerow([
+                        fields['name'],
+                        fields['description'],
                         nutritional_info,
-                        item['price']['formatted'],
-                        item['image']['url'] if 'image' in item and item['image'] is not None else None
-
-                    ]
-                    writer.writerow(row)
-                    #print(row)
\ No newline at end of file
+                        fields['price'],
+                        fields['image_url']
+                    ])
@@ -7,23 +7,89 @@ from json import loads
 from os import makedirs
 from pathlib import Path
 import validators
-from bs4 import BeautifulSoup
 from pandas import DataFrame, read_csv, concat
-from requests import get, HTTPError
 import concurrent.futures
-import time
-import random
+from collections import Counter
+import signal
+import threading
+from functools import partial
+from deliveroo_crawler import async_engine
+from deliveroo_crawler.archive import PageArchive
+from deliveroo_crawler.concurrency import AIMDController
+from deliveroo_crawler.export import ParquetSink
+from deliveroo_crawler.frontier import Frontier, FAILED as FRONTIER_FAILED
+from deliveroo_crawler.http_cache import ValidatorStore
+from deliveroo_crawler.next_data import MenuItemStream, decode_menu_header, decode_menu_meta, extract_next_data
+from deliveroo_crawler.pipeline import Pipeline
+from deliveroo_crawler.rate_limit import HostRateLimiter
+from deliveroo_crawler.retry import RetryPolicy, HostCircuitBreakers, get_with_retry
+from deliveroo_crawler.schema import MENU_ITEM_FIELDS, RESTAURANT_FIELDS, Schema
+from deliveroo_crawler.storage import MENU_ITEM_COLUMNS, close_writer, crawl_times, create_schema, insert_restaurants, open_writer, writer_for
+from deliveroo_crawler.transport import get_transport
+from deliveroo_crawler.urls import fetch_url, group_by_restaurant, restaurant_key
 
 # Setup logging
 logging.basicConfig(format="%(asctime)s - [%(levelname)s]\t%(message)s",
                     datefmt='%d-%b-%y %H:%M:%S')
 
+# Request budget per domain, shared by every worker regardless of the thread count
+REQUESTS_PER_SECOND = 2
+rate_limiter = HostRateLimiter(rate=REQUESTS_PER_SECOND, burst=5, jitter=0.5)
+
+# Upper bound on worker threads, the live level is set by the AIMD controller
+MAX_THREADS = 100
+concurrency = AIMDController(initial=5, maximum=MAX_THREADS)
+
+# Transient errors (timeouts, 429, 5xx) are retried, an outage pauses the whole pool
+retry_policy = RetryPolicy(attempts=4, base_delay=1.0, max_delay=60.0)
+circuit_breakers = HostCircuitBreakers(threshold=10, cooldown=30.0)
+
+# How the __NEXT_DATA__ payload is found in a page: 'bytes' slices it out of the raw response,
+# 'bs4' builds the full DOM first (also the fallback when 'bytes' finds nothing)
+NEXT_DATA_BACKEND = 'bytes'
+
+# Parse menu items incrementally while the DB writer consumes them in chunks of storage.MENU_CHUNK_SIZE, instead of
+# decoding them up front; besides the page itself, memory per page then stays flat on very large (grocery)
+# menus. Needs ijson, without it the whole menu is still decoded at once
+STREAM_MENU_ITEMS = False
+
+# Fields stored per restaurant and per menu item, compiled once into accessors;
+# menu items are slot records rather than dicts as a page can hold thousands of them
+RESTAURANT_SCHEMA = Schema(RESTAURANT_FIELDS).with_defaults(
+    name='Unknown Name', address='Unknown Address', lat='Unknown Latitude', lon='Unknown Longitude',
+    city='Unknown City', neighborhood='Unknown Neighborhood', postcode='Unknown Postcode',
+    cityId='Unknown City ID', zoneId='Unknown Zone ID', geohash='Unknown Geohash',
+).with_types(name=lambda name: name.lower().replace(" ", "_"))
+MENU_ITEM_SCHEMA = Schema(MENU_ITEM_FIELDS).project(MENU_ITEM_COLUMNS).with_defaults(
+    name='No Name', description='No Description', price='No Price', image_url='No Image URL',
+).with_types(price=lambda price: price.replace('AED\xa0', '')).as_records('MenuItem')
+
+# What this run extracts, narrowed with project_fields()
+restaurant_schema = RESTAURANT_SCHEMA
+menu_item_schema = MENU_ITEM_SCHEMA
+
+# Outcomes of scrape_single_url, counted in the run stats
+OK = 'ok'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+
+class ExtractionError(Exception):
+    """A fetched page with no restaurant in it (no __NEXT_DATA__, or no menu meta), failed like a fetch."""
+
 class DeliverooScraper:
     def __init__(self, url: str, base_dir: str = 'crawled_data',
-                 f_name: str = 'crawled_data', menu_dir: str = 'menus'):
+                 f_name: str = 'crawled_data', menu_dir: str = 'menus', content: bytes = None,
+                 validator_store: ValidatorStore = None, archive: PageArchive = None):
         self.url = url
-        self.__details_json = None
-        self.__bs4_data = None
+        self.__menu_meta = None
+        self.__next_data = None
+
+        # Every listing URL that pointed at this restaurant, filled in by the caller
+        self.listed_urls = [url]
+
+        # Set from the response when the page is fetched with conditional headers
+        self.unchanged = False
+        self.response_validators = {}
 
         self.__restaurant_details = {}
         self.__restaurant_menu_details = []
@@ -38,238 +104,491 @@ class DeliverooScraper:
             logging.error(f"'{url}' is not a valid URL")
             return
 
-        self.__bs4_data = self.fetch_details(url)
-        if self.__bs4_data:
-            self.__details_json = self.make_json(self.__bs4_data)
-            if self.__details_json:
-                self.fetch_restaurant_details(self.__details_json)
-                self.fetch_restaurant_location()  # Ensure this is called
-                self.__restaurant_menu_details = self.extract_menu_items(self.__details_json)  # Extract menu items here
-
+        # Pages fetched elsewhere (e.g. by the async engine) are parsed as is
+        if content is not None:
+            self.__next_data = self.parse_details(content)
+        else:
+            raw = self.fetch_details(url, validator_store)
+            self.response_validators = ValidatorStore.validators(raw.headers)
+            # A 304 means the menu is as we stored it last time, skip parsing
+            self.unchanged = raw.status_code == 304
+            if not self.unchanged:
+                if archive is not None:
+                    archive.put(url, raw.content)
+                self.__next_data = self.parse_details(raw.content)
+        if self.__next_data:
+            # Items are not decoded at all when streaming or when no menu item field is projected
+            with_items = not STREAM_MENU_ITEMS and len(menu_item_schema) > 0
+            self.__menu_meta = self.make_json(self.__next_data, with_items=with_items)
+            if self.__menu_meta:
+                self.fetch_restaurant_details(self.__menu_meta)
+                if STREAM_MENU_ITEMS:
+                    # Items are parsed from the payload one by one as save_to_db consumes them
+                    self.__restaurant_menu_details = self.iter_menu_items(MenuItemStream(self.__next_data))
+                elif with_items:
+                    self.__restaurant_menu_details = self.extract_menu_items(self.__menu_meta)  # Extract menu items here
+            self.__next_data = None  # Only the decoded menu meta (or the item stream) is needed from here on
+
+
+    @property
+    def restaurant_details(self) -> dict:
+        return self.__restaurant_details
+
+    @property
+    def menu_items(self):
+        # A generator when STREAM_MENU_ITEMS is set, a list otherwise
+        return self.__restaurant_menu_details
 
     @staticmethod
     def url_validator(link: str) -> bool:
         return validators.url(link) and link.startswith('https://deliveroo.co.uk/')
 
     @staticmethod
-    def fetch_details(url):
-        try:
-            raw = get(url, allow_redirects=True, headers=(
-                {
-                    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                                  '(KHTML, like Gecko) Chrome/102.0.5005.63 Safari/537.36',
-                }
-            ))
-
-            status_code = raw.status_code
-            reason = raw.reason
-
-            if status_code != 200:
-                raise HTTPError(status_code, reason)
-
-            bs4_data = BeautifulSoup(raw.content, 'lxml')
-            return bs4_data
-
-        except HTTPError as e:
-            logging.error(f"{url} - {e.strerror} [{e.errno}]")
-            return None
-
-        except Exception as e:
-            logging.debug(e)
-            return None
+    def fetch_details(url, validator_store: ValidatorStore = None):
+        headers = validator_store.request_headers(url) if validator_store else {}
+        # Raises FetchError once retries are exhausted so the URL is requeued
+        return get_with_retry(get_transport(), url, retry_policy, circuit_breakers, rate_limiter,
+                              ok_statuses=(200, 304), allow_redirects=True, headers=headers)
 
-    def make_json(self, bs4_data):
+    @staticmethod
+    def parse_details(content):
+        next_data = extract_next_data(content, NEXT_DATA_BACKEND)
+        if next_data is None:
+            logging.error("No __NEXT_DATA__ script found in page")
+        return next_data
+
+    def make_json(self, next_data, with_items=True):
+        # Keeps only props.initialState.menuPage.menu.meta, the rest of the page state is dropped
         try:
-            data = bs4_data.select('#__NEXT_DATA__')[0].text
-            details_json = loads(data)
-            return details_json
+            if with_items:
+                return decode_menu_meta(next_data)
+            return decode_menu_header(next_data)
 
         except Exception as e:
             logging.error(e)
             return None
 
 
-    def fetch_restaurant_details(self, details_json):
-        try:
-            restaurant = details_json['props']['initialState']['menuPage']['menu']['meta']['restaurant']
-            self.__restaurant_details['name'] = restaurant.get('name', 'Unknown Name').lower().replace(" ", "_")
-            self.__restaurant_details['address'] = restaurant.get('location', {}).get('address', {}).get('address1', 'Unknown Address')
-            self.__restaurant_details['neighborhood'] = restaurant.get('location', {}).get('address', {}).get('neighborhood', 'Unknown Neighborhood')
-        except KeyError as e:
-            logging.error(f"Key error while fetching restaurant details: {e}")
-            self.__restaurant_details['name'] = 'Unknown Name'
-            self.__restaurant_details['address'] = 'Unknown Address'
-            self.__restaurant_details['neighborhood'] = 'Unknown Neighborhood'
-        except Exception as e:
-            logging.error(f"Error in fetch_restaurant_details: {e}")
+    def fetch_restaurant_details(self, menu_meta):
+        # Restaurant and customerLocation fields in one pass, missing ones get the schema defaults
+        self.__restaurant_details = restaurant_schema(menu_meta)
 
-    def fetch_restaurant_location(self):
-        try:
-            restaurant_location = self.__details_json['props']['initialState']['menuPage']['menu']['meta']['customerLocation']
-            self.__restaurant_details['lat'] = restaurant_location.get('lat', 'Unknown Latitude')
-            self.__restaurant_details['lon'] = restaurant_location.get('lon', 'Unknown Longitude')
-            self.__restaurant_details['city'] = restaurant_location.get('city', 'Unknown City')
-            self.__restaurant_details['neighborhood'] = restaurant_location.get('neighborhood', 'Unknown Neighborhood')
-            self.__restaurant_details['postcode'] = restaurant_location.get('postcode', 'Unknown Postcode')
-            self.__restaurant_details['cityId'] = restaurant_location.get('cityId', 'Unknown City ID')
-            self.__restaurant_details['zoneId'] = restaurant_location.get('zoneId', 'Unknown Zone ID')
-            self.__restaurant_details['geohash'] = restaurant_location.get('geohash', 'Unknown Geohash')
-
-        except KeyError as e:
-            logging.error(f"Key error while fetching restaurant location: {e}")
-            # Set default values for all location details in case of KeyError
-            self.__restaurant_details.update({
-                'lat': 'Unknown Latitude',
-                'lon': 'Unknown Longitude',
-                'city': 'Unknown City',
-                'neighborhood': 'Unknown Neighborhood',
-                'postcode': 'Unknown Postcode',
-                'cityId': 'Unknown City ID',
-                'zoneId': 'Unknown Zone ID',
-                'geohash': 'Unknown Geohash'
-            })
-
-        except Exception as e:
-            logging.error(f"Error in fetch_restaurant_location: {e}")
+    def extract_menu_items(self, menu_meta):
+        return list(self.iter_menu_items(menu_meta['items']))
 
+    def iter_menu_items(self, menu_items):
+        if len(menu_item_schema) == 0:
+            return
+        for item in menu_items:
+            yield menu_item_schema(item)
 
-    def extract_menu_items(self, details_json):
-        menu_items = details_json['props']['initialState']['menuPage']['menu']['meta']['items']
-        menu_data = []
+    def save_to_db(self, db_name: str, on_written=None, on_failed=None, crawled_at=None):
+        self.save_parsed(db_name, self.url, self.__restaurant_details, self.__restaurant_menu_details,
+                         self.listed_urls, on_written, on_failed, crawled_at)
 
-        for item in menu_items:
-            try:
-                name = item.get('name', 'No Name')
-                description = item.get('description', 'No Description')
-                price = item.get('price', {}).get('formatted', 'No Price').replace('AED\xa0', '')
-                image_data = item.get('image')
-                image_url = image_data.get('url') if image_data else 'No Image URL'
-
-                menu_data.append({
-                    'name': name,
-                    'description': description,
-                    'price': price,
-                    'image_url': image_url    
-                })
-            except KeyError as e:
-                logging.error(f"Key error while fetching menu item: {e}")
-                continue  # Skip this item and continue with the next
-            except Exception as e:
-                logging.error(f"Error in extract_menu_items: {e}")
-                continue  # Skip this item and continue with the next
+    @staticmethod
+    def save_parsed(db_name: str, url: str, restaurant_details: dict, menu_items, listed_urls: list,
+                    on_written=None, on_failed=None, crawled_at=None):
+        # Also used by the pipeline's writer, which receives the parsed data from a worker process
+        if not restaurant_details:
+            # Raised so the URL is failed and requeued rather than counted as done
+            raise ExtractionError(f"No restaurant details extracted from {url}")
+
+        # During a run every write goes through the single batched writer of the DB
+        writer = writer_for(db_name)
+        if writer is not None:
+            writer.put(url, restaurant_details, menu_items, listed_urls, on_written, on_failed, crawled_at)
+            return
 
-        return menu_data
-    
-    def save_to_db(self, db_name: str):
         try:
             # Create or connect to a SQLite database
             with sqlite3.connect(db_name) as conn:
-                c = conn.cursor()
-
-                # Create tables if they don't exist
-                c.execute('''CREATE TABLE IF NOT EXISTS restaurant (
-                                id INTEGER PRIMARY KEY,
-                                name TEXT,
-                                address TEXT,
-                                neighborhood TEXT,
-                                lat REAL,
-                                lon REAL,
-                                city TEXT,
-                                postcode TEXT,
-                                cityId INTEGER,
-                                zoneId INTEGER,
-                                geohash TEXT
-                            )''')
-
-                c.execute('''CREATE TABLE IF NOT EXISTS menu (
-                                id INTEGER PRIMARY KEY,
-                                restaurant_id INTEGER,
-                                name TEXT,
-                                description TEXT,
-                                price TEXT,
-                                image_url TEXT,
-                                FOREIGN KEY (restaurant_id) REFERENCES restaurant (id)
-                            )''')
-
-                # Insert restaurant details
-                c.execute('''INSERT INTO restaurant 
-                             (name, address, neighborhood, lat, lon, city, postcode, cityId, zoneId, geohash) 
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                          (self.__restaurant_details['name'], self.__restaurant_details['address'],
-                           self.__restaurant_details['neighborhood'], self.__restaurant_details['lat'],
-                           self.__restaurant_details['lon'], self.__restaurant_details['city'],
-                           self.__restaurant_details['postcode'], self.__restaurant_details['cityId'],
-                           self.__restaurant_details['zoneId'], self.__restaurant_details['geohash']))
-                restaurant_id = c.lastrowid
-
-                # Insert menu items
-                for item in self.__restaurant_menu_details:
-                    c.execute('INSERT INTO menu (restaurant_id, name, description, price, image_url) VALUES (?, ?, ?, ?, ?)',
-                              (restaurant_id, item['name'], item['description'], item['price'], item['image_url']))
-
+                create_schema(conn)
+                insert_restaurants(conn, [(url, restaurant_details, menu_items, listed_urls, crawled_at)])
                 # Commit is handled automatically by the context manager
+            if on_written is not None:
+                on_written()
 
         except sqlite3.Error as e:
             logging.error(f"SQLite error: {e}")
-            # Optionally, handle or re-raise
+            if on_failed is not None:
+                on_failed(e)
 
         except Exception as e:
             logging.error(f"General error in save_to_db: {e}")
-            # Optionally, handle or re-raise
-
+            if on_failed is not None:
+                on_failed(e)
+
+
+# Function to start the batched DB writer of a run, also streaming to Parquet when export_dir is set
+def start_writer(db_name, export_dir=None):
+    sinks = [ParquetSink(export_dir)] if export_dir else []
+    return open_writer(db_name, sinks=sinks)
+
+# Function to build the writer callbacks that settle a URL once its batch is committed or dropped
+def write_callbacks(url, frontier=None, validator_store=None, response_validators=None):
+    def on_written():
+        # Only remember the validators once the page is stored
+        if validator_store is not None:
+            validator_store.save(url, response_validators)
+        if frontier is not None:
+            frontier.complete(url)
+
+    def on_failed(exc):
+        # Failed URLs get the run's final pass
+        if frontier is not None:
+            frontier.fail(url, f"write: {exc}")
+
+    return on_written, on_failed
+
+# Function to wait until every queued write is committed or dropped, so each URL is settled
+def flush_writer(db_name):
+    writer = writer_for(db_name)
+    if writer is not None:
+        writer.flush()
+
+# Function to narrow what a run extracts to the given restaurant and menu item fields, None keeps them all
+def project_fields(restaurant=None, menu_item=None):
+    global restaurant_schema, menu_item_schema
+    restaurant_schema = RESTAURANT_SCHEMA if restaurant is None else RESTAURANT_SCHEMA.project(restaurant)
+    if menu_item is None:
+        menu_item_schema = MENU_ITEM_SCHEMA
+    else:
+        # The item id is the key menu rows are upserted on, it comes along with any other item field
+        menu_item_schema = MENU_ITEM_SCHEMA.project({*menu_item, 'item_id'} if menu_item else ())
 
 # Function to read URLs from a file
 def read_urls_from_file(file_path):
     with open(file_path, 'r') as file:
         return [line.strip() for line in file.readlines()] 
     
-# Function to handle scraping for a single URL
-def scrape_single_url(url, db_name):
-    try:
-        # Replace '=ASAP' with '=anytime' in the URL
-        url = url.replace('=ASAP', '=anytime')
+# Function to handle scraping for a single URL, returns OK or UNCHANGED and raises on failure; a stored page
+# completes its frontier URL once the writer commits it
+def scrape_single_url(url, db_name, validator_store=None, archive=None, listed_urls=None, frontier=None):
+    # Replace '=ASAP' with '=anytime' in the URL
+    url = fetch_url(url)
+
+    scraper = DeliverooScraper(url, validator_store=validator_store, archive=archive)
+    scraper.listed_urls = listed_urls or [url]
+    if scraper.unchanged:
+        return UNCHANGED
+
+    scraper.save_to_db(db_name, *write_callbacks(url, frontier, validator_store, scraper.response_validators))
+    return OK
+
+# Function to scrape a single URL while holding a concurrency slot
+def scrape_single_url_limited(url, db_name, validator_store=None, archive=None, listed_urls=None, frontier=None):
+    with concurrency:
+        return scrape_single_url(url, db_name, validator_store, archive, listed_urls, frontier)
+
+# Function to extract and save a page that has already been fetched, at crawled_at (Unix time) if given
+def scrape_content(url, content, db_name, archive=None, listings=None, frontier=None, crawled_at=None):
+    if archive is not None:
+        archive.put(url, content)
+    scraper = DeliverooScraper(url, content=content)
+    if listings:
+        scraper.listed_urls = listings.get(url, [url])
+    scraper.save_to_db(db_name, *write_callbacks(url, frontier), crawled_at=crawled_at)
+
+# Function to map each restaurant's fetch URL to every listing URL that named it
+def dedupe_listings(urls):
+    listings = {}
+    for variants in group_by_restaurant(urls).values():
+        listings[fetch_url(variants[0])] = variants
+
+    logging.info(f"{len(urls)} listed URLs map to {len(listings)} restaurants")
+    return listings
+
+# Function to open the crawl frontier for a run: an interrupted round is resumed unless fresh is set,
+# after a finished one (e.g. yesterday's crawl) every URL is crawled again
+def open_frontier(file_path, db_name, fresh=False):
+    frontier = Frontier(db_name)
+    if fresh or frontier.finished():
+        frontier.reset()
+    elif frontier.resumed:
+        logging.warning(f"Resuming: {frontier.resumed} URLs left in flight by the last run are pending again")
+    else:
+        logging.warning(f"Resuming the interrupted round: {frontier.counts()}")
+
+    # Each restaurant is fetched once, however many listings and query variants name it
+    frontier.add(dedupe_listings(read_urls_from_file(file_path)))
+    logging.info(f"Frontier: {frontier.counts()}")
+    return frontier
+
+# Function to stop claiming new work on Ctrl-C while in-flight URLs drain
+def install_stop_handler(stop):
+    if threading.current_thread() is not threading.main_thread():
+        return None
+
+    def handler(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        logging.warning("Interrupted, draining in-flight URLs (Ctrl-C again to abort)")
+        stop.set()
+
+    return signal.signal(signal.SIGINT, handler)
+
+# Function to run one pass over the pending frontier URLs, claiming them in batches
+def scrape_pass(frontier, db_name, validator_store=None, stats=None, archive=None, stop=None,
+                batch_size=100):
+    stats = Counter() if stats is None else stats
+    stop = stop or threading.Event()
+    future_to_url = {}
 
-        scraper = DeliverooScraper(url)
-        scraper.save_to_db(db_name)
-
-        # Introduce a random delay between requests to mimic human behavior and reduce server load
-        time.sleep(random.uniform(1, 3))  # Random delay between 1 and 3 seconds
-
-    except Exception as e:
-        logging.error(f"Failed to scrape {url}: {e}")
-        return url  # Return the URL that failed
+    # Using ThreadPoolExecutor to create and manage threads
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
+        while True:
+            # Keep at most two batches claimed so an interrupt leaves little to hand back
+            if not stop.is_set() and len(future_to_url) < batch_size:
+                for url, listed_urls in frontier.claim(batch_size):
+                    future = executor.submit(scrape_single_url_limited, url, db_name, validator_store, archive,
+                                             listed_urls, frontier)
+                    future_to_url[future] = url
+
+            if stop.is_set():
+                # Work that has not started yet goes back to pending for the next run
+                for future in [future for future in future_to_url if future.cancel()]:
+                    frontier.release(future_to_url.pop(future))
+
+            if not future_to_url:
+                break
+
+            done, _ = concurrent.futures.wait(future_to_url, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                url = future_to_url.pop(future)
+                try:
+                    # Retrieve result (if any exception occurred, it will be raised here)
+                    result = future.result()
+                    stats[result] += 1
+                    # Stored pages are completed by the writer once committed
+                    if result == UNCHANGED:
+                        frontier.complete(url)
+                except Exception as exc:
+                    logging.error(f"Failed to scrape {url}: {exc}")
+                    stats[FAILED] += 1
+                    frontier.fail(url, str(exc))
+
+    flush_writer(db_name)
+    return stats
 
 # Modified function to scrape URLs using multithreading
-def scrape_urls(file_path, db_name):
-    urls = read_urls_from_file(file_path)
-    failed_urls = []
+def scrape_urls(file_path, db_name, conditional=True, archive_dir=None, fresh=False, batch_size=100,
+                export_dir=None):
+    frontier = open_frontier(file_path, db_name, fresh)
+    stats = Counter()
 
-    # Define the maximum number of threads
-    MAX_THREADS = 5  # Start with a lower number and adjust as needed
+    # Raw pages are kept so extraction changes can be replayed without the network
+    archive = PageArchive(archive_dir) if archive_dir else None
 
-    # Using ThreadPoolExecutor to create and manage threads
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        # Start the load operations and mark each future with its URL
-        future_to_url = {executor.submit(scrape_single_url, url, db_name): url for url in urls}
+    # Validators from earlier runs let unchanged menus come back as 304
+    validator_store = ValidatorStore(db_name) if conditional else None
 
-        for future in concurrent.futures.as_completed(future_to_url):
-            url = future_to_url[future]
-            try:
-                # Retrieve result (if any exception occurred, it will be raised here)
-                result = future.result()
-                if result:
-                    failed_urls.append(result)
-            except Exception as exc:
-                logging.error(f'{url} generated an exception: {exc}')
+    # Responses drive the concurrency level, threads beyond it wait for a slot
+    get_transport().add_listener(concurrency.record)
+    stop = threading.Event()
+    previous_handler = install_stop_handler(stop)
+
+    # Workers queue their results, one thread writes them in batches
+    start_writer(db_name, export_dir)
+    try:
+        scrape_pass(frontier, db_name, validator_store, stats, archive, stop, batch_size)
+        if not stop.is_set() and (requeued := frontier.requeue_failed()):
+            # URLs that exhausted their retries get one final pass at the end of the run
+            logging.warning(f"Requeueing {requeued} failed URLs for a final pass")
+            stats['requeued'] = requeued
+            stats[FAILED] = 0
+            scrape_pass(frontier, db_name, validator_store, stats, archive, stop, batch_size)
+    finally:
+        close_writer(db_name)
+        if previous_handler is not None:
+            signal.signal(signal.SIGINT, previous_handler)
+        get_transport().remove_listener(concurrency.record)
+
+    logging.info(f"Run stats: {dict(stats)}, frontier: {frontier.counts()}")
+    get_transport().log_stats()
 
     # Optionally, save the failed URLs to a file or handle them as needed
     with open('failed_urls_multithreaded.txt', 'w') as file:
-        for url in failed_urls:
+        for url in frontier.urls(FRONTIER_FAILED):
             file.write(url + '\n')
+    frontier.close()
 
-# Example usage
-input_file = "../url_collector/data/london_rest_links_deliveroo.txt"  # Path to the file containing URLs
-scrape_urls(input_file, "deliveroo_london.db")
+# Function to scrape URLs on a single asyncio event loop
+def scrape_urls_async(file_path, db_name, max_in_flight=1000, archive_dir=None, fresh=False, batch_size=10000,
+                      export_dir=None):
+    frontier = open_frontier(file_path, db_name, fresh)
+
+    archive = PageArchive(archive_dir) if archive_dir else None
+    options = dict(max_in_flight=max_in_flight, rate_limiter=rate_limiter,
+                   retry_policy=retry_policy, circuit_breakers=circuit_breakers)
+
+    stop = threading.Event()
+    previous_handler = install_stop_handler(stop)
+    start_writer(db_name, export_dir)
+    try:
+        for final_pass in (False, True):
+            if final_pass and not stop.is_set() and (requeued := frontier.requeue_failed()):
+                logging.warning(f"Requeueing {requeued} failed URLs for a final pass")
+
+            # An interrupt lets the URLs in flight finish and hands the rest of the batch back
+            while not stop.is_set() and (batch := frontier.claim(batch_size)):
+                listings = dict(batch)
+                handler = partial(scrape_content, db_name=db_name, archive=archive, listings=listings,
+                                  frontier=frontier)
+                failed_urls, unstarted_urls = async_engine.run(list(listings), handler, stop=stop, **options)
+                # Only failures are settled here, stored pages are completed by the writer once committed
+                for url in failed_urls:
+                    frontier.fail(url, 'fetch or extraction failed, see log')
+                for url in unstarted_urls:
+                    frontier.release(url)
+            flush_writer(db_name)
+    finally:
+        close_writer(db_name)
+        if previous_handler is not None:
+            signal.signal(signal.SIGINT, previous_handler)
+
+    logging.info(f"Frontier: {frontier.counts()}")
+    with open('failed_urls_async.txt', 'w') as file:
+        for url in frontier.urls(FRONTIER_FAILED):
+            file.write(url + '\n')
+    frontier.close()
+
+# Function to fetch a page in the pipeline's I/O stage, returns None when the menu is unchanged
+def fetch_page(item, validator_store=None, archive=None):
+    url, listed_urls = item
+    url = fetch_url(url)
+    with concurrency:
+        raw = DeliverooScraper.fetch_details(url, validator_store)
+    if raw.status_code == 304:
+        return None
+    if archive is not None:
+        archive.put(url, raw.content)
+    return url, listed_urls, raw.content, ValidatorStore.validators(raw.headers)
+
+# Function to extract a fetched page in a worker process, only plain data is sent back
+def parse_page(page):
+    url, listed_urls, content, response_validators = page
+    scraper = DeliverooScraper(url, content=content)
+    return url, listed_urls, scraper.restaurant_details, list(scraper.menu_items), response_validators
+
+# Function to persist a parsed page, run on the pipeline's single writer thread
+def write_page(parsed, db_name, validator_store=None, frontier=None):
+    url, listed_urls, restaurant_details, menu_items, response_validators = parsed
+    DeliverooScraper.save_parsed(db_name, url, restaurant_details, menu_items, listed_urls,
+                                 *write_callbacks(url, frontier, validator_store, response_validators))
+
+# Function to hand out pending frontier URLs until the run is stopped
+def claim_pending(frontier, stop, batch_size=100):
+    while not stop.is_set() and (batch := frontier.claim(batch_size)):
+        for i, item in enumerate(batch):
+            if stop.is_set():
+                # Claimed but never queued, back to pending for the next run
+                for url, _ in batch[i:]:
+                    frontier.release(url)
+                return
+            yield item
+
+# Function to run one pass over the pending frontier URLs through the fetch/parse/write pipeline
+def pipeline_pass(frontier, db_name, validator_store=None, stats=None, archive=None, stop=None,
+                  fetch_workers=MAX_THREADS, parse_workers=None, queue_size=1000):
+    stats = Counter() if stats is None else stats
+    stop = stop or threading.Event()
+
+    def on_done(url, stage):
+        if stage == 'write':
+            # Queued for the DB writer, which completes the URL once its batch is committed
+            stats[OK] += 1
+        else:
+            # Items that stop at the fetch stage came back as 304
+            stats[UNCHANGED] += 1
+            frontier.complete(url)
+
+    def on_error(url, stage, exc):
+        stats[FAILED] += 1
+        frontier.fail(url, f"{stage}: {exc}")
+
+    pipeline = Pipeline(partial(fetch_page, validator_store=validator_store, archive=archive),
+                        parse_page,
+                        partial(write_page, db_name=db_name, validator_store=validator_store, frontier=frontier),
+                        key=lambda item: item[0], on_done=on_done, on_error=on_error,
+                        fetch_workers=fetch_workers, parse_workers=parse_workers, queue_size=queue_size)
+    # Per-stage utilisation is logged by the pipeline once the pass has drained
+    pipeline.run(claim_pending(frontier, stop, min(queue_size, 100)))
+    flush_writer(db_name)
+    return stats
+
+# Function to scrape URLs with I/O threads, a process pool for parsing and a single DB writer
+def scrape_urls_pipelined(file_path, db_name, conditional=True, archive_dir=None, fresh=False,
+                          parse_workers=None, queue_size=1000, export_dir=None):
+    frontier = open_frontier(file_path, db_name, fresh)
+    stats = Counter()
+    archive = PageArchive(archive_dir) if archive_dir else None
+    validator_store = ValidatorStore(db_name) if conditional else None
+
+    get_transport().add_listener(concurrency.record)
+    stop = threading.Event()
+    previous_handler = install_stop_handler(stop)
+
+    options = dict(parse_workers=parse_workers, queue_size=queue_size)
+    start_writer(db_name, export_dir)
+    try:
+        pipeline_pass(frontier, db_name, validator_store, stats, archive, stop, **options)
+        if not stop.is_set() and (requeued := frontier.requeue_failed()):
+            logging.warning(f"Requeueing {requeued} failed URLs for a final pass")
+            stats['requeued'] = requeued
+            stats[FAILED] = 0
+            pipeline_pass(frontier, db_name, validator_store, stats, archive, stop, **options)
+    finally:
+        close_writer(db_name)
+        if previous_handler is not None:
+            signal.signal(signal.SIGINT, previous_handler)
+        get_transport().remove_listener(concurrency.record)
+
+    logging.info(f"Run stats: {dict(stats)}, frontier: {frontier.counts()}")
+    get_transport().log_stats()
+
+    with open('failed_urls_pipelined.txt', 'w') as file:
+        for url in frontier.urls(FRONTIER_FAILED):
+            file.write(url + '\n')
+    frontier.close()
+
+# Function to rerun extraction and DB writes from archived pages, without the network
+def replay_archive(archive_dir, db_name, since=None, until=None, export_dir=None, latest=True):
+    archive = PageArchive(archive_dir)
+    replayed = 0
+    skipped = 0
+
+    # Opened first so the DB is migrated before its crawl times are read
+    start_writer(db_name, export_dir)
+    try:
+        with sqlite3.connect(db_name) as conn:
+            crawled = crawl_times(conn)
+        # With latest=False every archived fetch is replayed, oldest first
+        for url, fetched_at, content in archive.iter_pages(since=since, until=until, latest=latest):
+            # A page older than the stored crawl would move crawled_at back and record its changes out of order
+            if crawled.get(restaurant_key(url), fetched_at) > fetched_at:
+                skipped += 1
+                continue
+            try:
+                # Recorded at the time of the archived fetch, so the menu history stays in crawl order
+                scrape_content(url, content, db_name, crawled_at=fetched_at)
+                replayed += 1
+            except Exception as e:
+                logging.error(f"Failed to replay {url}: {e}")
+    finally:
+        close_writer(db_name)
+
+    logging.info(f"Replayed {replayed} archived pages into {db_name}, skipped {skipped} older than its crawls")
+
+if __name__ == '__main__':
+    # Example usage
+    input_file = path.join(path.dirname(__file__), "..", "url_collector", "data",
+                           "london_rest_links_deliveroo.txt")  # Path to the file containing URLs
+    scrape_urls(input_file, "deliveroo_london.db")
+    # scrape_urls_async(input_file, "deliveroo_london.db", max_in_flight=1000)
+    # scrape_urls_pipelined(input_file, "deliveroo_london.db")
+    # replay_archive("page_archive", "deliveroo_london.db")
+    # scrape_urls(input_file, "deliveroo_london.db", export_dir="parquet")  # Also streams a Parquet dataset
 
 
 # Example usage
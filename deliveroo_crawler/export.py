@@ -0,0 +1,272 @@
+"""
+Columnar Parquet export of crawled restaurants and menus.
+
+Files are laid out as hive partitions, ``<root>/<table>/market=uk/city=London/crawl_date=2026-10-18/*.parquet``,
+so ``pandas.read_parquet(root + '/menu', filters=[('city', '=', 'London')])`` only scans that city. The crawl
+date is the UTC day each restaurant was last crawled:
+
+    python -m deliveroo_crawler.export deliveroo_london.db parquet --market uk
+"""
+import argparse
+import datetime
+import shutil
+import sqlite3
+import uuid
+from pathlib import Path
+from urllib.parse import unquote
+
+import pandas as pd
+
+from deliveroo_crawler.storage import MENU_ITEM_COLUMNS, RESTAURANT_COLUMNS, item_key, open_read_only
+from deliveroo_crawler.urls import restaurant_key
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed when exporting
+    pa = pq = None
+
+PARTITION_COLUMNS = ('market', 'city', 'crawl_date')
+
+# Partition value for rows whose market, city or crawl date is unknown
+UNKNOWN = 'unknown'
+
+# Where the day a restaurant was last crawled is read from, first found first; DBs from before
+# restaurant.crawled_at fall back to its latest menu change
+CRAWL_TIMES = {
+    ('restaurant', 'crawled_at'): 'restaurant.crawled_at',
+    ('menu_change', 'crawled_at'): '(SELECT MAX(crawled_at) FROM menu_change WHERE restaurant_id = restaurant.id)',
+}
+
+
+def _string_dictionary():
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def arrow_schemas() -> dict:
+    """
+    Typed Arrow schema per table. Repetitive strings are dictionary-encoded in memory
+    as well as in the files.
+    """
+    partitions = [('market', _string_dictionary()), ('city', _string_dictionary()), ('crawl_date', pa.string())]
+    return {
+        'restaurant': pa.schema([
+            ('url_key', pa.string()),
+            ('name', pa.string()),
+            ('address', pa.string()),
+            ('neighborhood', _string_dictionary()),
+            ('lat', pa.float64()),
+            ('lon', pa.float64()),
+            ('postcode', _string_dictionary()),
+            ('cityId', pa.int64()),
+            ('zoneId', pa.int64()),
+            ('geohash', pa.string()),
+            *partitions,
+        ]),
+        'menu': pa.schema([
+            ('url_key', pa.string()),
+            ('item_id', pa.string()),
+            ('name', pa.string()),
+            ('description', pa.string()),
+            ('price', pa.string()),
+            ('image_url', pa.string()),
+            ('price_minor', pa.int64()),
+            ('currency', _string_dictionary()),
+            ('kcal', pa.int64()),
+            *partitions,
+        ]),
+    }
+
+
+def crawl_date(crawled_at: float) -> str:
+    """UTC date of a Unix crawl time, as partitioned on."""
+    return datetime.datetime.fromtimestamp(crawled_at, datetime.timezone.utc).date().isoformat()
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _select(conn: sqlite3.Connection, table: str, columns: tuple) -> str:
+    """Select list of ``columns``, NULL for those an older DB does not have yet."""
+    existing = _columns(conn, table)
+    return ', '.join(column if column in existing else f'NULL AS {column}' for column in columns)
+
+
+def _crawl_date(conn: sqlite3.Connection) -> str:
+    """SQL expression of a restaurant row's crawl date partition."""
+    sources = [expression for (table, column), expression in CRAWL_TIMES.items() if column in _columns(conn, table)]
+    if not sources:
+        return f"'{UNKNOWN}'"
+    return f"IFNULL(date(COALESCE({', '.join(sources)}, NULL), 'unixepoch'), '{UNKNOWN}')"
+
+
+def remove_partitions(root: str, partitions: set) -> None:
+    """Delete the ``(market, city, crawl_date)`` partitions listed in ``partitions`` from every table under ``root``."""
+    for directory in Path(root).glob('*/market=*/city=*/crawl_date=*'):
+        # Partition values are percent-encoded in the directory names
+        values = tuple(unquote(part.name.split('=', 1)[1])
+                       for part in (directory.parent.parent, directory.parent, directory))
+        if values in partitions:
+            shutil.rmtree(directory)
+
+
+def market(url_key: str) -> str:
+    """Market of a restaurant from its key's host: ``deliveroo.co.uk/...`` -> ``uk``."""
+    tld = (url_key or '').split('/', 1)[0].rsplit('.', 1)[-1]
+    return tld if tld.isalpha() else UNKNOWN
+
+
+def _to_table(frame: pd.DataFrame, schema) -> 'pa.Table':
+    frame = frame.reindex(columns=schema.names)
+    for field in schema:
+        if pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            # Stored placeholders such as 'Unknown Latitude' become nulls
+            frame[field.name] = pd.to_numeric(frame[field.name], errors='coerce')
+            if pa.types.is_integer(field.type):
+                frame[field.name] = frame[field.name].round().astype('Int64')
+        else:
+            frame[field.name] = frame[field.name].astype(object).where(frame[field.name].notna(), None)
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def write_partitions(root: str, table_name: str, frame: pd.DataFrame) -> None:
+    """Append ``frame`` to ``<root>/<table_name>`` as new part files, one per partition it touches."""
+    if frame.empty:
+        return
+    frame = frame.assign(market=frame['market'].fillna(UNKNOWN), city=frame['city'].fillna(UNKNOWN))
+    table = _to_table(frame, arrow_schemas()[table_name])
+    pq.write_to_dataset(table, root_path=str(Path(root) / table_name), partition_cols=list(PARTITION_COLUMNS),
+                        basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+                        existing_data_behavior='overwrite_or_ignore')
+
+
+class ParquetSink:
+    """
+    Streams the restaurants a crawl writes into the Parquet dataset, alongside the SQLite DB.
+
+    Attached to :class:`deliveroo_crawler.storage.SQLiteWriter`, which hands over every restaurant
+    as it is written; rows are held back until their batch is committed, then buffered and written
+    as part files of about ``batch_rows`` menu items.
+
+    :param root: Dataset directory, holding ``restaurant/`` and ``menu/``
+    :param market: Market of every row, derived from each restaurant's URL if None
+    :param batch_rows: Menu items buffered before a flush
+    """
+
+    def __init__(self, root: str, market: str = None, batch_rows: int = 100_000) -> None:
+        if pa is None:
+            raise ImportError("ParquetSink needs the 'pyarrow' package (pip install pyarrow)")
+        self.root = root
+        self.market = market
+        self.batch_rows = batch_rows
+        self.__restaurants = []
+        self.__menu = []
+        # Rows of the batch being written, by URL key
+        self.__pending = {}
+
+    def write_restaurant(self, url: str, restaurant_details: dict, crawled_at: float) -> None:
+        key = restaurant_key(url)
+        partition = {
+            'market': self.market or market(key),
+            'city': restaurant_details.get('city'),
+            'crawl_date': crawl_date(crawled_at),
+        }
+        restaurant = {'url_key': key, **{column: restaurant_details.get(column) for column in RESTAURANT_COLUMNS},
+                      **partition}
+        self.__pending[key] = (partition, restaurant, [])
+
+    def write_items(self, url: str, menu_items: list) -> None:
+        key = restaurant_key(url)
+        partition, _, menu = self.__pending[key]
+        menu.extend({'url_key': key, **{column: item.get(column) for column in MENU_ITEM_COLUMNS},
+                     'item_id': item_key(item), **partition} for item in menu_items)
+
+    def discard(self, url: str) -> None:
+        self.__pending.pop(restaurant_key(url), None)
+
+    def commit(self) -> None:
+        for _, restaurant, menu in self.__pending.values():
+            self.__restaurants.append(restaurant)
+            self.__menu.extend(menu)
+        self.__pending = {}
+        if len(self.__menu) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        write_partitions(self.root, 'restaurant', pd.DataFrame(self.__restaurants))
+        write_partitions(self.root, 'menu', pd.DataFrame(self.__menu))
+        self.__restaurants = []
+        self.__menu = []
+
+    def close(self) -> None:
+        self.flush()
+
+
+def export_db(db_name: str, root: str, market_name: str = None, overwrite: bool = True,
+              chunk_size: int = 5_000) -> dict:
+    """
+    Export a crawl DB to the Parquet dataset, each restaurant under the date it was last crawled.
+
+    The DB is only read; one written by an older version has to be migrated first
+    (``python -m deliveroo_crawler.storage``).
+
+    :param market_name: Market of every row, derived from each restaurant's URL key if None
+    :param overwrite: Remove the partitions this export writes (market, city and crawl date) from ``root`` first,
+        leaving those of other DBs exported there
+    :param chunk_size: Restaurants (with their menus) read and written at a time
+    :return: Number of ``restaurant`` and ``menu`` rows written
+    """
+    if pa is None:
+        raise ImportError("export_db needs the 'pyarrow' package (pip install pyarrow)")
+
+    written = {'restaurant': 0, 'menu': 0}
+    last_id = 0
+    with open_read_only(db_name, 'restaurant') as conn:
+        if 'url_key' not in _columns(conn, 'restaurant'):
+            raise SystemExit(f"{db_name} has no natural keys yet, "
+                             f"migrate it with: python -m deliveroo_crawler.storage {db_name}")
+        crawl_date_sql = _crawl_date(conn)
+        restaurant_columns = _select(conn, 'restaurant', RESTAURANT_COLUMNS)
+        menu_columns = _select(conn, 'menu', MENU_ITEM_COLUMNS)
+
+        if overwrite:
+            rows = conn.execute(f"SELECT DISTINCT substr(url_key, 1, instr(url_key || '/', '/') - 1), city, "
+                                f"{crawl_date_sql} FROM restaurant")
+            remove_partitions(root, {(market_name or market(host), city or UNKNOWN, date) for host, city, date in rows})
+
+        while True:
+            restaurants = pd.read_sql_query(
+                f'SELECT id, url_key, {restaurant_columns}, {crawl_date_sql} AS crawl_date FROM restaurant '
+                f'WHERE id > ? ORDER BY id LIMIT ?', conn, params=(last_id, chunk_size))
+            if restaurants.empty:
+                break
+            first_id, last_id = int(restaurants['id'].iloc[0]), int(restaurants['id'].iloc[-1])
+
+            restaurants['market'] = market_name or restaurants['url_key'].map(market)
+            menu = pd.read_sql_query(
+                f'SELECT restaurant_id, {menu_columns} FROM menu '
+                f'WHERE restaurant_id BETWEEN ? AND ?', conn, params=(first_id, last_id))
+            menu = menu.merge(restaurants[['id', 'url_key', 'market', 'city', 'crawl_date']],
+                              left_on='restaurant_id', right_on='id')
+
+            write_partitions(root, 'restaurant', restaurants)
+            write_partitions(root, 'menu', menu)
+            written['restaurant'] += len(restaurants)
+            written['menu'] += len(menu)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('db', help='Crawl DB, e.g. deliveroo_london.db')
+    parser.add_argument('root', help='Dataset directory')
+    parser.add_argument('--market', help='Market of every row (uk, ae, ...), derived from the URLs by default')
+    args = parser.parse_args()
+
+    written = export_db(args.db, args.root, args.market)
+    print(f"{written['restaurant']} restaurants and {written['menu']} menu items exported to {args.root}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+import time
+
+PENDING = 'pending'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Frontier:
+    """
+    Durable crawl frontier in a ``frontier`` table of the crawl database.
+
+    Every URL carries a status (pending, in_flight, done, failed), its attempt count
+    and last error. Opening the frontier puts URLs left in flight by a crash or
+    interrupt back to pending, so a restarted run resumes where the last one stopped.
+    A round that ran to the end leaves nothing pending; the next run starts a new one
+    over every URL (see :meth:`finished`).
+    """
+
+    def __init__(self, db_name: str) -> None:
+        self.db_name = db_name
+        self.__conn = sqlite3.connect(db_name, timeout=30, check_same_thread=False)
+        self.__lock = threading.Lock()
+
+        with self.__lock, self.__conn:
+            self.__conn.execute('''CREATE TABLE IF NOT EXISTS frontier (
+                                       url TEXT PRIMARY KEY,
+                                       listed_urls TEXT,
+                                       status TEXT NOT NULL DEFAULT 'pending',
+                                       attempts INTEGER NOT NULL DEFAULT 0,
+                                       last_error TEXT,
+                                       updated_at REAL
+                                   )''')
+            self.__conn.execute('CREATE INDEX IF NOT EXISTS frontier_status ON frontier (status)')
+            resumed = self.__conn.execute('UPDATE frontier SET status = ? WHERE status = ?',
+                                          (PENDING, IN_FLIGHT)).rowcount
+        self.resumed = resumed
+
+    def add(self, listings: dict) -> None:
+        """
+        Add URLs to the frontier; URLs already known keep their status.
+
+        :param listings: ``{url: [listing url, ...]}`` as built by ``dedupe_listings``
+        """
+        now = time.time()
+        with self.__lock, self.__conn:
+            self.__conn.executemany('''INSERT INTO frontier (url, listed_urls, status, updated_at)
+                                       VALUES (?, ?, ?, ?)
+                                       ON CONFLICT (url) DO UPDATE SET listed_urls = excluded.listed_urls''',
+                                    [(url, json.dumps(listed_urls), PENDING, now)
+                                     for url, listed_urls in listings.items()])
+
+    def finished(self) -> bool:
+        """True when no URL is pending or in flight, i.e. the last round was not interrupted."""
+        with self.__lock:
+            return self.__conn.execute('SELECT 1 FROM frontier WHERE status IN (?, ?) LIMIT 1',
+                                       (PENDING, IN_FLIGHT)).fetchone() is None
+
+    def reset(self) -> None:
+        """Start a fresh crawl over every known URL."""
+        with self.__lock, self.__conn:
+            self.__conn.execute('UPDATE frontier SET status = ?, attempts = 0, last_error = NULL, updated_at = ?',
+                                (PENDING, time.time()))
+
+    def claim(self, batch_size: int) -> list:
+        """
+        Move up to ``batch_size`` pending URLs to in_flight.
+
+        :return: List of ``(url, listed_urls)``
+        """
+        with self.__lock, self.__conn:
+            rows = self.__conn.execute('SELECT url, listed_urls FROM frontier WHERE status = ? LIMIT ?',
+                                       (PENDING, batch_size)).fetchall()
+            self.__conn.executemany('''UPDATE frontier SET status = ?, attempts = attempts + 1, updated_at = ?
+                                       WHERE url = ?''',
+                                    [(IN_FLIGHT, time.time(), url) for url, _ in rows])
+        return [(url, json.loads(listed_urls) if listed_urls else [url]) for url, listed_urls in rows]
+
+    def __set_status(self, url: str, status: str, error: str = None) -> None:
+        with self.__lock, self.__conn:
+            self.__conn.execute('UPDATE frontier SET status = ?, last_error = ?, updated_at = ? WHERE url = ?',
+                                (status, error, time.time(), url))
+
+    def complete(self, url: str) -> None:
+        self.__set_status(url, DONE)
+
+    def fail(self, url: str, error: str) -> None:
+        self.__set_status(url, FAILED, error)
+
+    def release(self, url: str) -> None:
+        """Hand a claimed URL back without counting the attempt, e.g. when a run is interrupted."""
+        with self.__lock, self.__conn:
+            self.__conn.execute('''UPDATE frontier SET status = ?, attempts = attempts - 1, updated_at = ?
+                                   WHERE url = ?''', (PENDING, time.time(), url))
+
+    def requeue_failed(self) -> int:
+        with self.__lock, self.__conn:
+            return self.__conn.execute('UPDATE frontier SET status = ?, updated_at = ? WHERE status = ?',
+                                       (PENDING, time.time(), FAILED)).rowcount
+
+    def urls(self, status: str) -> list:
+        with self.__lock:
+            return [url for url, in self.__conn.execute('SELECT url FROM frontier WHERE status = ?', (status,))]
+
+    def counts(self) -> dict:
+        with self.__lock:
+            return dict(self.__conn.execute('SELECT status, COUNT(*) FROM frontier GROUP BY status'))
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__conn.close()
@@ -0,0 +1,63 @@
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode(lat: float, lon: float, precision: int = 12) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash = []
+    bits, bit_count, even = 0, 0, True
+    while len(geohash) < precision:
+        # Even bits split longitude, odd bits split latitude
+        value, value_range = (lon, lon_range) if even else (lat, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits <<= 1
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(geohash)
+
+
+def bbox(geohash: str) -> tuple:
+    """:return: ``(lat_min, lat_max, lon_min, lon_max)`` of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            mid = (value_range[0] + value_range[1]) / 2
+            if (bits >> shift) & 1:
+                value_range[0] = mid
+            else:
+                value_range[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def center(geohash: str) -> tuple:
+    lat_min, lat_max, lon_min, lon_max = bbox(geohash)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+
+def children(geohash: str) -> list:
+    return [geohash + char for char in BASE32]
+
+
+def intersects(geohash: str, area: tuple) -> bool:
+    """Whether a cell overlaps ``area`` given as ``(lat_min, lat_max, lon_min, lon_max)``."""
+    lat_min, lat_max, lon_min, lon_max = bbox(geohash)
+    return lat_min < area[1] and lat_max > area[0] and lon_min < area[3] and lon_max > area[2]
+
+
+def cover(area: tuple, precision: int) -> list:
+    """Geohash cells of ``precision`` characters covering ``area`` (lat_min, lat_max, lon_min, lon_max)."""
+    cells = ['']
+    for _ in range(precision):
+        cells = [cell for parent in cells for cell in children(parent) if intersects(cell, area)]
+    return cells
@@ -0,0 +1,90 @@
+"""
+Past menus, rebuilt from the ``menu_change`` rows the crawl writes.
+
+Each crawl records only the items added, changed or removed since the previous one, so a
+restaurant's menu at time ``t`` is, per item, its last change at or before ``t`` unless that was
+a removal:
+
+    python -m deliveroo_crawler.history deliveroo_london.db <menu url> --at 2026-10-01
+    python -m deliveroo_crawler.history deliveroo_london.db <menu url> --item 12345
+"""
+import argparse
+import datetime
+import sqlite3
+import time
+
+from deliveroo_crawler.storage import MENU_ITEM_COLUMNS, REMOVED, open_read_only
+from deliveroo_crawler.urls import restaurant_key
+
+MENU_AT = f'''SELECT {", ".join(MENU_ITEM_COLUMNS)} FROM (
+                  SELECT *, ROW_NUMBER() OVER (PARTITION BY item_id ORDER BY crawled_at DESC, id DESC) AS latest
+                  FROM menu_change WHERE restaurant_id = ? AND crawled_at <= ?)
+              WHERE latest = 1 AND change != ? ORDER BY id'''
+ITEM_HISTORY = f'''SELECT crawled_at, change, {", ".join(MENU_ITEM_COLUMNS)} FROM menu_change
+                   WHERE restaurant_id = ? AND item_id = ? ORDER BY crawled_at, id'''
+
+
+def restaurant_id(conn: sqlite3.Connection, url: str) -> int | None:
+    row = conn.execute('SELECT id FROM restaurant WHERE url_key = ?', (restaurant_key(url),)).fetchone()
+    return row[0] if row else None
+
+
+def menu_at(conn: sqlite3.Connection, url: str, at: float = None) -> list:
+    """
+    A restaurant's menu as crawled at a past time.
+
+    :param url: Menu URL of the restaurant
+    :param at: Unix time, now if None
+    :return: Item dicts in :data:`deliveroo_crawler.storage.MENU_ITEM_COLUMNS`, empty for an unknown restaurant
+    """
+    rid = restaurant_id(conn, url)
+    if rid is None:
+        return []
+    at = time.time() if at is None else at
+    return [dict(zip(MENU_ITEM_COLUMNS, row)) for row in conn.execute(MENU_AT, (rid, at, REMOVED))]
+
+
+def item_history(conn: sqlite3.Connection, url: str, item_id: str) -> list:
+    """Every recorded version of one menu item, oldest first, each with its ``crawled_at`` and ``change``."""
+    rid = restaurant_id(conn, url)
+    if rid is None:
+        return []
+    columns = ('crawled_at', 'change', *MENU_ITEM_COLUMNS)
+    return [dict(zip(columns, row)) for row in conn.execute(ITEM_HISTORY, (rid, str(item_id)))]
+
+
+def parse_time(value: str) -> float:
+    """Unix time from an ISO date or datetime (UTC unless it has an offset) or a number."""
+    try:
+        return float(value)
+    except ValueError:
+        moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(timespec='seconds')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('db', help='Crawl DB, e.g. deliveroo_london.db')
+    parser.add_argument('url', help='Menu URL of the restaurant')
+    parser.add_argument('--at', type=parse_time, help='ISO date/time (UTC) or Unix time, now by default')
+    parser.add_argument('--item', help='Print the history of this item id instead of a menu')
+    args = parser.parse_args()
+
+    with open_read_only(args.db, 'menu_change') as conn:
+        if args.item is not None:
+            for version in item_history(conn, args.url, args.item):
+                print(f"{_format_time(version['crawled_at'])}  {version['change']:<8} "
+                      f"{version['price'] or '':>10}  {version['name']}")
+        else:
+            for item in menu_at(conn, args.url, args.at):
+                print(f"{item['item_id']:<12} {item['price'] or '':>10}  {item['name']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import sqlite3
+import threading
+import time
+
+from deliveroo_crawler.urls import canonical_url
+
+
+class ValidatorStore:
+    """
+    ETag / Last-Modified validators per canonical URL, kept next to the crawled data.
+
+    Living in the same SQLite file as the restaurant tables means a fresh database
+    never receives 304s for pages it has not stored yet.
+    """
+
+    def __init__(self, db_name: str) -> None:
+        self.db_name = db_name
+        self.__local = threading.local()
+
+        with self.__connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS http_validators (
+                                url TEXT PRIMARY KEY,
+                                etag TEXT,
+                                last_modified TEXT,
+                                updated_at REAL
+                            )''')
+
+    def __connection(self) -> sqlite3.Connection:
+        if not hasattr(self.__local, 'conn'):
+            self.__local.conn = sqlite3.connect(self.db_name, timeout=30)
+        return self.__local.conn
+
+    def request_headers(self, url: str) -> dict:
+        """Conditional request headers for ``url``, empty if it was never stored."""
+        row = self.__connection().execute('SELECT etag, last_modified FROM http_validators WHERE url = ?',
+                                          (canonical_url(url),)).fetchone()
+        headers = {}
+        if row:
+            etag, last_modified = row
+            if etag:
+                headers['if-none-match'] = etag
+            if last_modified:
+                headers['if-modified-since'] = last_modified
+        return headers
+
+    @staticmethod
+    def validators(response_headers) -> dict:
+        return {'etag': response_headers.get('etag'), 'last_modified': response_headers.get('last-modified')}
+
+    def save(self, url: str, validators: dict) -> None:
+        if not validators or not (validators.get('etag') or validators.get('last_modified')):
+            return
+        with self.__connection() as conn:
+            conn.execute('''INSERT OR REPLACE INTO http_validators (url, etag, last_modified, updated_at)
+                            VALUES (?, ?, ?, ?)''',
+                         (canonical_url(url), validators.get('etag'), validators.get('last_modified'), time.time()))
@@ -0,0 +1,112 @@
+import concurrent.futures
+import time
+from collections import Counter
+from functools import partial
+from urllib.parse import urlsplit
+
+import lxml.html
+
+from deliveroo_crawler import geohash
+from deliveroo_crawler.rate_limit import HostRateLimiter
+from deliveroo_crawler.retry import HostCircuitBreakers, RetryPolicy, get_with_retry
+from deliveroo_crawler.transport import get_transport
+from deliveroo_crawler.urls import restaurant_key
+
+
+def menu_links(content: bytes, listing_url: str) -> list:
+    """
+    Absolute ``/menu/`` links on a restaurant listing page, in page order.
+
+    Uses lxml directly and only looks at ``href`` attributes, which is far cheaper
+    than building a BeautifulSoup tree with ``html.parser``.
+    """
+    parts = urlsplit(listing_url)
+    base = f'{parts.scheme}://{parts.netloc}'
+    tree = lxml.html.fromstring(content)
+    return [base + href for href in tree.xpath('//a/@href') if href.startswith('/menu/')]
+
+
+def fetch_listing(listing_url: str, rate_limiter: HostRateLimiter = None, retry_policy: RetryPolicy = None,
+                  circuit_breakers: HostCircuitBreakers = None) -> dict:
+    """
+    Fetch one listing page and collect its menu links.
+
+    Pass the crawler's ``rate_limiter``, ``retry_policy`` and ``circuit_breakers`` so listing
+    requests share the per-host budget, retries and outage pauses of the menu fetches.
+
+    :return: ``{'listing', 'links', 'seconds', 'status'}``
+    :raises FetchError: Once retries are exhausted
+    """
+    start = time.monotonic()
+    raw = get_with_retry(get_transport(), listing_url, retry_policy or RetryPolicy(attempts=1),
+                         circuit_breakers or HostCircuitBreakers(), rate_limiter)
+    links = menu_links(raw.content, listing_url)
+    return {
+        'listing': listing_url,
+        'links': links,
+        'seconds': time.monotonic() - start,
+        'status': raw.status_code,
+    }
+
+
+def discover(listing_template: str, area: tuple, on_links, start_precision: int = 4, max_precision: int = 6,
+             max_workers: int = 16, rate_limiter: HostRateLimiter = None, retry_policy: RetryPolicy = None,
+             circuit_breakers: HostCircuitBreakers = None) -> Counter:
+    """
+    Discover menu links by tiling ``area`` with geohash cells and fetching one listing page per cell.
+
+    A cell is split into its 32 children only while its listing page still shows restaurants
+    no earlier page had; cells that add nothing new are pruned.
+
+    :param listing_template: Listing URL with a ``{geohash}`` placeholder, fed the cell centre
+    :param area: City bounding box ``(lat_min, lat_max, lon_min, lon_max)``
+    :param on_links: Callable ``on_links(cell, links)`` receiving each cell's new links as it completes
+    :param start_precision: Geohash length of the initial tiling
+    :param max_precision: Geohash length beyond which cells are not split
+    :param max_workers: Number of listing pages fetched in parallel
+    :param rate_limiter: Shared per-host request budget, awaited before every listing request
+    :param retry_policy: Retries of transient failures, a single attempt if None
+    :param circuit_breakers: Pause a host during an outage
+    :return: Counter of ``requests``, ``failed``, ``split``, ``pruned`` and ``links``
+    """
+    seen = set()
+    stats = Counter()
+    cells = geohash.cover(area, start_precision)
+    fetch = partial(fetch_listing, rate_limiter=rate_limiter, retry_policy=retry_policy,
+                    circuit_breakers=circuit_breakers or HostCircuitBreakers())
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while cells:
+            future_to_cell = {
+                executor.submit(fetch, listing_template.format(geohash=geohash.encode(*geohash.center(cell)))): cell
+                for cell in cells
+            }
+            cells = []
+
+            for future in concurrent.futures.as_completed(future_to_cell):
+                cell = future_to_cell[future]
+                stats['requests'] += 1
+                try:
+                    page = future.result()
+                except Exception:
+                    stats['failed'] += 1
+                    continue
+
+                new_links = []
+                for link in page['links']:
+                    key = restaurant_key(link)
+                    if key not in seen:
+                        seen.add(key)
+                        new_links.append(link)
+
+                if not new_links:
+                    stats['pruned'] += 1
+                    continue
+
+                stats['links'] += len(new_links)
+                on_links(cell, new_links)
+                if len(cell) < max_precision:
+                    stats['split'] += 1
+                    cells.extend(child for child in geohash.children(cell) if geohash.intersects(child, area))
+
+    return stats
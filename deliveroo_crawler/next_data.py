@@ -0,0 +1,139 @@
+import io
+import json
+import logging
+
+from bs4 import BeautifulSoup
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib decoder
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # Streaming falls back to decoding the whole meta subtree
+    ijson = None
+
+NEXT_DATA_ID = b'id="__NEXT_DATA__"'
+
+# The only part of the Next.js state the extractors read
+MENU_META_PATH = ('props', 'initialState', 'menuPage', 'menu', 'meta')
+MENU_META_PREFIX = '.'.join(MENU_META_PATH)
+
+
+def extract_bytes(content: bytes) -> bytes | None:
+    """
+    Slice the ``__NEXT_DATA__`` script payload straight out of the response bytes.
+
+    Script contents are raw text in HTML (no entities), so the payload between the
+    opening tag and the next ``</script>`` is the JSON document as served.
+    """
+    marker = content.find(NEXT_DATA_ID)
+    if marker == -1:
+        return None
+    # The id has to sit inside a <script ...> tag, not in some other element
+    tag_start = content.rfind(b'<', 0, marker)
+    if content[tag_start:tag_start + 7].lower() != b'<script':
+        return None
+    start = content.find(b'>', marker)
+    end = content.find(b'</script>', start)
+    if start == -1 or end == -1:
+        return None
+    return content[start + 1:end]
+
+
+def extract_bs4(content: bytes) -> str | None:
+    """Build the full DOM with BeautifulSoup/lxml and select the script tag."""
+    tags = BeautifulSoup(content, 'lxml').select('#__NEXT_DATA__')
+    return tags[0].text if tags else None
+
+
+BACKENDS = {
+    'bytes': extract_bytes,
+    'bs4': extract_bs4,
+}
+
+
+def extract_next_data(content: bytes, backend: str = 'bytes') -> bytes | str | None:
+    """
+    Return the ``__NEXT_DATA__`` JSON text of a Next.js page.
+
+    :param content: Raw response body
+    :param backend: One of ``BACKENDS``; anything but ``bs4`` falls back to it when it finds nothing
+    :return: The JSON payload, or None if the page has no ``__NEXT_DATA__`` script
+    """
+    payload = BACKENDS[backend](content)
+    if payload is None and backend != 'bs4':
+        logging.debug(f"'{backend}' found no __NEXT_DATA__, falling back to bs4")
+        payload = extract_bs4(content)
+    return payload
+
+
+def loads(payload: bytes | str):
+    """Decode JSON with orjson when it is installed, else with the stdlib."""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def decode_menu_meta(payload: bytes | str) -> dict:
+    """
+    Decode a ``__NEXT_DATA__`` payload and keep only ``props.initialState.menuPage.menu.meta``.
+
+    Walking down with a single reference lets the rest of the decoded tree be freed
+    as soon as this returns, instead of living as long as the scraper.
+
+    :raises KeyError: If the payload is not a menu page
+    """
+    data = loads(payload)
+    for key in MENU_META_PATH:
+        data = data[key]
+    return data
+
+
+def decode_menu_header(payload: bytes | str) -> dict:
+    """
+    Like :func:`decode_menu_meta` but without ``items``: only ``restaurant`` and ``customerLocation``.
+
+    With ijson installed each key is parsed incrementally, so the items are never decoded here.
+    """
+    if ijson is None:
+        meta = decode_menu_meta(payload)
+        meta.pop('items', None)
+        return meta
+
+    if isinstance(payload, str):
+        payload = payload.encode()
+    header = {}
+    for key in ('restaurant', 'customerLocation'):
+        values = ijson.items(io.BytesIO(payload), f'{MENU_META_PREFIX}.{key}', use_float=True)
+        header[key] = next(values, None)
+    if header['restaurant'] is None and header['customerLocation'] is None:
+        raise KeyError('menu')
+    return header
+
+
+def stream_menu_items(payload: bytes | str):
+    """
+    Yield the entries of ``meta.items`` one at a time.
+
+    With ijson installed the payload is parsed incrementally, so only one item is
+    materialised at a time however large the menu is.
+    """
+    if ijson is None:
+        yield from decode_menu_meta(payload).get('items', [])
+        return
+
+    if isinstance(payload, str):
+        payload = payload.encode()
+    yield from ijson.items(io.BytesIO(payload), f'{MENU_META_PREFIX}.items.item', use_float=True)
+
+
+class MenuItemStream:
+    """Re-iterable view of the menu items of a payload; every pass streams them again."""
+
+    def __init__(self, payload: bytes | str) -> None:
+        self.payload = payload
+
+    def __iter__(self):
+        return stream_menu_items(self.payload)
@@ -0,0 +1,141 @@
+"""
+Typed prices and calories.
+
+Prices become integer minor units (pence, fils) plus an ISO currency code, calories an integer kcal.
+The scalar functions run at extraction time; :func:`normalise_prices` backfills the prices of rows stored before.
+"""
+import re
+import sqlite3
+import sys
+
+import pandas as pd
+
+# Minor units per major unit, two decimals for every currency Deliveroo prices in
+MINOR_UNITS = 100
+
+CURRENCY_SYMBOLS = {'£': 'GBP', '€': 'EUR', '$': 'USD', 'د.إ': 'AED'}
+
+# e.g. '£12.50', 'د.إ 12.50', 'AED\xa01,250.00', '12.50 AED'; commas are thousands separators, the
+# prefix may hold a dot since the dirham sign does
+PRICE_PATTERN = r'^\s*(?P<prefix>[^\d\s,-]*)\s*(?P<amount>\d[\d,]*(?:\.\d+)?)\s*(?P<suffix>[A-Za-z]{3})?\s*$'
+KCAL_PATTERN = r'(?P<kcal>\d[\d,]*)\s*kcal'
+KJ_PATTERN = r'(?P<kj>\d[\d,]*)\s*kJ'
+
+_price = re.compile(PRICE_PATTERN)
+_kcal = re.compile(KCAL_PATTERN, re.IGNORECASE)
+_kj = re.compile(KJ_PATTERN, re.IGNORECASE)
+
+KJ_PER_KCAL = 4.184
+
+# Typed columns added next to the raw ``price`` text of the menu table
+MENU_COLUMNS = {'price_minor': 'INTEGER', 'currency': 'TEXT', 'kcal': 'INTEGER'}
+
+
+def currency_code(symbol: str) -> str | None:
+    if not symbol:
+        return None
+    return CURRENCY_SYMBOLS.get(symbol, symbol.upper() if len(symbol) == 3 and symbol.isalpha() else None)
+
+
+def parse_price(formatted: str) -> tuple:
+    """
+    Parse a display price.
+
+    :return: ``(minor units, currency code)``, either None when it cannot be read
+    """
+    match = _price.match(formatted or '')
+    if not match:
+        return None, None
+    minor = round(float(match['amount'].replace(',', '')) * MINOR_UNITS)
+    return minor, currency_code(match['prefix'] or match['suffix'])
+
+
+def price_minor(price: dict) -> int | None:
+    """Minor units from a menu item's ``price``, preferring the exact ``fractional`` value."""
+    fractional = price.get('fractional')
+    if isinstance(fractional, int):
+        return fractional
+    return parse_price(price.get('formatted'))[0]
+
+
+def price_currency(price: dict) -> str | None:
+    code = price.get('code') or parse_price(price.get('formatted'))[1]
+    # Interned, so the few codes in use are shared by every item instead of one string per item
+    return sys.intern(code) if code else None
+
+
+def parse_kcal(energy: str) -> int | None:
+    """Integer kcal from e.g. ``'520 kcal'``, converting from kJ when only that is given."""
+    if not energy:
+        return None
+    if match := _kcal.search(energy):
+        return int(match['kcal'].replace(',', ''))
+    if match := _kj.search(energy):
+        return round(int(match['kj'].replace(',', '')) / KJ_PER_KCAL)
+    return None
+
+
+def normalise_prices(formatted: pd.Series, default_currency: str = None) -> pd.DataFrame:
+    """
+    Vectorised :func:`parse_price` over a column of display prices.
+
+    :param default_currency: Used where the text carries no currency (e.g. prices stored with it stripped)
+    :return: Frame with nullable ``price_minor`` and ``currency`` columns, aligned on ``formatted``
+    """
+    parts = formatted.astype('string').str.extract(PRICE_PATTERN)
+    amount = pd.to_numeric(parts['amount'].str.replace(',', '', regex=False), errors='coerce')
+    symbol = parts['prefix'].where(parts['prefix'].fillna('') != '', parts['suffix'])
+
+    currency = symbol.map(CURRENCY_SYMBOLS, na_action='ignore')
+    currency = currency.fillna(symbol.where(symbol.str.fullmatch('[A-Za-z]{3}', na=False)).str.upper())
+    if default_currency is not None:
+        currency = currency.where(amount.isna() | currency.notna(), default_currency)
+
+    return pd.DataFrame({
+        'price_minor': (amount * MINOR_UNITS).round().astype('Int64'),
+        'currency': currency.astype('string'),
+    })
+
+
+def ensure_menu_columns(conn: sqlite3.Connection) -> None:
+    """Add the typed columns to a menu table created before they existed."""
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(menu)')}
+    for column, sql_type in MENU_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f'ALTER TABLE menu ADD COLUMN {column} {sql_type}')
+
+
+def _nullable(series: pd.Series) -> list:
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def backfill_prices(db_name: str, default_currency: str = None, chunk_size: int = 100_000) -> int:
+    """
+    Fill ``price_minor`` and ``currency`` of stored menu rows from their ``price`` text.
+
+    Rows are read in id order, ``chunk_size`` at a time, parsed column-wise and written back
+    with one ``executemany`` per chunk. Rows whose text cannot be parsed stay NULL.
+
+    :param default_currency: Currency of prices stored without one, e.g. ``'AED'`` for the Dubai DB
+    :return: Number of rows updated
+    """
+    updated = 0
+    last_id = 0
+    with sqlite3.connect(db_name) as conn:
+        ensure_menu_columns(conn)
+        while True:
+            chunk = pd.read_sql_query(
+                'SELECT id, price FROM menu WHERE id > ? AND price_minor IS NULL ORDER BY id LIMIT ?',
+                conn, params=(last_id, chunk_size))
+            if chunk.empty:
+                break
+            last_id = int(chunk['id'].iloc[-1])
+
+            prices = normalise_prices(chunk['price'], default_currency)
+            parsed = prices['price_minor'].notna()
+            rows = zip(_nullable(prices['price_minor'][parsed]), _nullable(prices['currency'][parsed]),
+                       chunk['id'][parsed].tolist())
+            conn.executemany('UPDATE menu SET price_minor = ?, currency = ? WHERE id = ?', rows)
+            updated += int(parsed.sum())
+            conn.commit()
+    return updated
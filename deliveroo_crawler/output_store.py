@@ -0,0 +1,150 @@
+"""
+Consolidated CSV output: one append-only file per borough and table instead of one per restaurant.
+
+Each table file starts with a ``Restaurant`` column holding the name the per-restaurant CSV would
+have had, and is appended to by every run, e.g. ``crawled_data/camden/menus.csv.zst``. zstd files
+are written as one frame per run, which ``pandas.read_csv`` reads back like any other CSV.
+"""
+import csv
+import glob
+import io
+import os
+import threading
+
+try:
+    import zstandard
+except ImportError:  # Only needed for compressed output
+    zstandard = None
+
+# Write buffer of each open table file, in bytes
+BUFFER_SIZE = 1 << 16
+ZSTD_LEVEL = 3
+
+RESTAURANT_COLUMN = 'Restaurant'
+
+
+class _TableFile:
+    """One table of one directory, its current segment kept open for appending."""
+
+    def __init__(self, directory: str, table: str, header: list, compress: bool, segment_bytes: int = None) -> None:
+        self.directory = directory
+        self.table = table
+        self.header = [RESTAURANT_COLUMN, *header]
+        self.compress = compress
+        self.segment_bytes = segment_bytes
+        self.__raw = None
+        self.__text = None
+        self.__writer = None
+
+        self.segment = 0
+        if segment_bytes is not None:
+            # A new run carries on in the last segment of the previous one
+            prefix = os.path.join(directory, table) + '-'
+            existing = glob.glob(glob.escape(prefix) + '[0-9]' * 5 + self.__suffix())
+            self.segment = max((int(name[len(prefix):len(prefix) + 5]) for name in existing), default=0)
+            if os.path.exists(self.filename) and os.path.getsize(self.filename) >= segment_bytes:
+                self.segment += 1
+
+    def __suffix(self) -> str:
+        return '.csv.zst' if self.compress else '.csv'
+
+    @property
+    def filename(self) -> str:
+        name = self.table if self.segment_bytes is None else f'{self.table}-{self.segment:05d}'
+        return os.path.join(self.directory, name + self.__suffix())
+
+    def __open(self) -> None:
+        self.__raw = open(self.filename, 'ab', buffering=BUFFER_SIZE)
+        new = self.__raw.tell() == 0
+        stream = self.__raw
+        if self.compress:
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(self.__raw, closefd=False)
+        # Buffered below the text layer, so the file position tracks what was written
+        self.__text = io.TextIOWrapper(stream, encoding='utf-8', newline='', write_through=True)
+        self.__writer = csv.writer(self.__text)
+        if new:
+            self.__writer.writerow(self.header)
+
+    def writerow(self, row: list) -> None:
+        if self.__writer is None:
+            self.__open()
+        elif self.segment_bytes is not None and self.__raw.tell() >= self.segment_bytes:
+            self.close()
+            self.segment += 1
+            self.__open()
+        self.__writer.writerow(row)
+
+    def close(self) -> None:
+        if self.__text is not None:
+            # Ends the zstd frame, then the file
+            self.__text.close()
+            if self.compress:
+                self.__raw.close()
+            self.__raw = self.__text = self.__writer = None
+
+
+class RestaurantRows:
+    """The rows of one restaurant in a consolidated table, a drop-in for a per-restaurant CSV writer."""
+
+    def __init__(self, table: _TableFile, restaurant: str, lock: threading.Lock) -> None:
+        self.__table = table
+        self.__restaurant = restaurant
+        self.__lock = lock
+
+    def writerow(self, row: list) -> None:
+        with self.__lock:
+            self.__table.writerow([self.__restaurant, *row])
+
+    def close(self) -> None:
+        # The table file stays open for the next restaurant, OutputStore.close() closes it
+        pass
+
+    def __enter__(self) -> 'RestaurantRows':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class OutputStore:
+    """
+    Open table files of a run, one per (directory, table).
+
+    Directories are created the first time a table in them is written, so once per run, and
+    files stay open with a write buffer until :meth:`close`, however many restaurants go in.
+
+    :param compress: Write zstd-compressed ``.csv.zst`` files (needs the 'zstandard' package)
+    :param segment_bytes: Roll over to a new numbered segment file once one reaches about this size
+    """
+
+    def __init__(self, compress: bool = False, segment_bytes: int = None) -> None:
+        if compress and zstandard is None:
+            raise ImportError("Compressed output needs the 'zstandard' package (pip install zstandard)")
+        self.compress = compress
+        self.segment_bytes = segment_bytes
+        self.__tables = {}
+        self.__directories = set()
+        self.__lock = threading.Lock()
+
+    def rows(self, directory: str, table: str, header: list, restaurant: str) -> RestaurantRows:
+        """Writer for one restaurant's rows of ``table`` under ``directory``; ``header`` names its columns."""
+        with self.__lock:
+            key = (directory, table)
+            if key not in self.__tables:
+                if directory not in self.__directories:
+                    os.makedirs(directory, exist_ok=True)
+                    self.__directories.add(directory)
+                self.__tables[key] = _TableFile(directory, table, header, self.compress, self.segment_bytes)
+            return RestaurantRows(self.__tables[key], restaurant, self.__lock)
+
+    def close(self) -> None:
+        with self.__lock:
+            for table in self.__tables.values():
+                table.close()
+            self.__tables = {}
+
+    def __enter__(self) -> 'OutputStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
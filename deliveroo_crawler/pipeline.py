@@ -0,0 +1,223 @@
+import concurrent.futures
+import logging
+import os
+import queue
+import threading
+import time
+from functools import partial
+
+# Marks the end of the work on a queue
+_DONE = object()
+
+
+def _timed(func, value):
+    """Run ``func`` in a worker process and send back how long it took alongside the result."""
+    start = time.perf_counter()
+    result = func(value)
+    return time.perf_counter() - start, result
+
+
+class StageStats:
+    """
+    Counters of one pipeline stage.
+
+    :param name: Stage name used in reports
+    :param workers: Number of workers the stage runs on
+    """
+
+    def __init__(self, name: str, workers: int) -> None:
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.__started = time.monotonic()
+        self.__finished = None
+        self.__lock = threading.Lock()
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        with self.__lock:
+            self.items += 1
+            self.errors += error
+            self.busy += seconds
+
+    def finish(self) -> None:
+        self.__finished = time.monotonic()
+
+    @property
+    def utilisation(self) -> float:
+        """Share of the stage's worker time spent working rather than waiting on its queues."""
+        elapsed = (self.__finished or time.monotonic()) - self.__started
+        if elapsed <= 0:
+            return 0.0
+        return self.busy / (elapsed * self.workers)
+
+    def as_dict(self) -> dict:
+        return {'workers': self.workers, 'items': self.items, 'errors': self.errors,
+                'busy': round(self.busy, 3), 'utilisation': round(self.utilisation, 3)}
+
+
+class Pipeline:
+    """
+    Fetch, parse and write stages connected by bounded queues.
+
+    Fetching runs on a thread pool, parsing on a process pool so CPU-bound extraction is not
+    serialised by the GIL, and writing on a single thread. A full queue blocks the stage feeding
+    it, so a slow stage throttles the ones before it instead of piling up pages in memory.
+
+    A stage returning None finishes the item there (e.g. a 304 needs no parsing).
+
+    :param fetch: ``fetch(item)``, run on ``fetch_workers`` threads
+    :param parse: ``parse(page)``, run in ``parse_workers`` processes; must be picklable
+    :param write: ``write(parsed)``, run on one thread
+    :param key: Maps an input item to the key passed to the callbacks
+    :param on_done: ``on_done(key, stage)`` with the name of the stage the item finished in
+    :param on_error: ``on_error(key, stage, exc)`` when a stage raises
+    :param fetch_workers: Number of fetch threads
+    :param parse_workers: Number of parse processes, ``os.cpu_count()`` if None
+    :param queue_size: Capacity of each queue between two stages
+    """
+
+    STAGES = ('fetch', 'parse', 'write')
+
+    def __init__(self, fetch, parse, write, key=None, on_done=None, on_error=None, fetch_workers: int = 100,
+                 parse_workers: int = None, queue_size: int = 1000) -> None:
+        self.fetch = fetch
+        self.parse = parse
+        self.write = write
+        self.key = key or (lambda item: item)
+        self.on_done = on_done
+        self.on_error = on_error
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.stats = {}
+
+        # Callbacks come from every stage's threads, they are called one at a time
+        self.__callback_lock = threading.Lock()
+
+    def __done(self, key, stage: str) -> None:
+        if self.on_done is not None:
+            with self.__callback_lock:
+                self.on_done(key, stage)
+
+    def __error(self, key, stage: str, exc: Exception) -> None:
+        logging.error(f"{stage} failed for {key}: {exc}")
+        if self.on_error is not None:
+            with self.__callback_lock:
+                self.on_error(key, stage, exc)
+
+    def __feed(self, items, fetch_queue: queue.Queue) -> None:
+        try:
+            for item in items:
+                fetch_queue.put(item)
+        finally:
+            for _ in range(self.fetch_workers):
+                fetch_queue.put(_DONE)
+
+    def __fetch_worker(self, fetch_queue: queue.Queue, parse_queue: queue.Queue) -> None:
+        stats = self.stats['fetch']
+        while (item := fetch_queue.get()) is not _DONE:
+            key = self.key(item)
+            start = time.perf_counter()
+            try:
+                page = self.fetch(item)
+            except Exception as exc:
+                stats.record(time.perf_counter() - start, error=True)
+                self.__error(key, 'fetch', exc)
+                continue
+            stats.record(time.perf_counter() - start)
+
+            if page is None:
+                self.__done(key, 'fetch')
+            else:
+                parse_queue.put((key, page))
+
+    def __dispatch(self, executor, parse_queue: queue.Queue, pending: queue.Queue) -> None:
+        # ``pending`` is bounded too, so at most queue_size pages sit in the process pool
+        parse = partial(_timed, self.parse)
+        while (entry := parse_queue.get()) is not _DONE:
+            key, page = entry
+            pending.put((key, executor.submit(parse, page)))
+        pending.put(_DONE)
+
+    def __collect(self, pending: queue.Queue, write_queue: queue.Queue) -> None:
+        stats = self.stats['parse']
+        while (entry := pending.get()) is not _DONE:
+            key, future = entry
+            try:
+                seconds, parsed = future.result()
+            except Exception as exc:
+                stats.record(0.0, error=True)
+                self.__error(key, 'parse', exc)
+                continue
+            stats.record(seconds)
+
+            if parsed is None:
+                self.__done(key, 'parse')
+            else:
+                write_queue.put((key, parsed))
+        write_queue.put(_DONE)
+
+    def __writer(self, write_queue: queue.Queue) -> None:
+        stats = self.stats['write']
+        while (entry := write_queue.get()) is not _DONE:
+            key, parsed = entry
+            start = time.perf_counter()
+            try:
+                self.write(parsed)
+            except Exception as exc:
+                stats.record(time.perf_counter() - start, error=True)
+                self.__error(key, 'write', exc)
+                continue
+            stats.record(time.perf_counter() - start)
+            self.__done(key, 'write')
+
+    def run(self, items) -> dict:
+        """
+        Push ``items`` through every stage and wait until the last one is written.
+
+        :param items: Iterable of work items, consumed lazily as the fetch queue drains
+        :return: ``{stage: StageStats.as_dict()}``
+        """
+        fetch_queue = queue.Queue(self.queue_size)
+        parse_queue = queue.Queue(self.queue_size)
+        pending = queue.Queue(self.queue_size)
+        write_queue = queue.Queue(self.queue_size)
+        self.stats = {
+            'fetch': StageStats('fetch', self.fetch_workers),
+            'parse': StageStats('parse', self.parse_workers),
+            'write': StageStats('write', 1),
+        }
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+            feeder = threading.Thread(target=self.__feed, args=(items, fetch_queue), daemon=True)
+            fetchers = [threading.Thread(target=self.__fetch_worker, args=(fetch_queue, parse_queue), daemon=True)
+                        for _ in range(self.fetch_workers)]
+            dispatcher = threading.Thread(target=self.__dispatch, args=(executor, parse_queue, pending), daemon=True)
+            collector = threading.Thread(target=self.__collect, args=(pending, write_queue), daemon=True)
+            writer = threading.Thread(target=self.__writer, args=(write_queue,), daemon=True)
+
+            for thread in (feeder, *fetchers, dispatcher, collector, writer):
+                thread.start()
+
+            # Each stage is closed once everything upstream of it has finished
+            feeder.join()
+            for thread in fetchers:
+                thread.join()
+            self.stats['fetch'].finish()
+            parse_queue.put(_DONE)
+            dispatcher.join()
+            collector.join()
+            self.stats['parse'].finish()
+            writer.join()
+            self.stats['write'].finish()
+
+        self.log_stats()
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def log_stats(self) -> None:
+        for name in self.STAGES:
+            stats = self.stats[name]
+            logging.info(f"Stage {name}: {stats.items} items, {stats.errors} errors, "
+                         f"{stats.utilisation:.0%} utilisation of {stats.workers} workers")
@@ -0,0 +1,92 @@
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens per second, holding at most ``burst``.
+
+    A caller that finds the bucket empty reserves the next token and sleeps until
+    it is due, so waiting callers are spaced out instead of retrying in a loop.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, jitter: float = 0.0) -> None:
+        """
+        :param rate: Sustained number of requests per second
+        :param burst: Number of requests that may go out back to back
+        :param jitter: Extra random delay in seconds (uniform 0..jitter) added to every wait
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.jitter = jitter
+
+        self.__tokens = float(self.burst)
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token, possibly one that is not available yet.
+
+        :return: Number of seconds the caller has to wait before using it
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+            self.__updated = now
+            self.__tokens -= 1
+            delay = -self.__tokens / self.rate if self.__tokens < 0 else 0.0
+
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class HostRateLimiter:
+    """One :class:`TokenBucket` per domain (deliveroo.co.uk, deliveroo.ae, ...)."""
+
+    def __init__(self, rate: float, burst: int = 1, jitter: float = 0.0, overrides: dict = None) -> None:
+        """
+        :param rate: Default requests per second for each domain
+        :param burst: Default burst size for each domain
+        :param jitter: Default jitter in seconds for each domain
+        :param overrides: ``{domain: {'rate': ..., 'burst': ..., 'jitter': ...}}`` per-domain settings
+        """
+        self.defaults = {'rate': rate, 'burst': burst, 'jitter': jitter}
+        self.overrides = overrides or {}
+
+        self.__buckets = {}
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def domain(url: str) -> str:
+        host = urlsplit(url).hostname or ''
+        return host[4:] if host.startswith('www.') else host
+
+    def bucket(self, url: str) -> TokenBucket:
+        domain = self.domain(url)
+        with self.__lock:
+            if domain not in self.__buckets:
+                self.__buckets[domain] = TokenBucket(**{**self.defaults, **self.overrides.get(domain, {})})
+            return self.__buckets[domain]
+
+    def acquire(self, url: str) -> None:
+        self.bucket(url).acquire()
+
+    async def acquire_async(self, url: str) -> None:
+        await self.bucket(url).acquire_async()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import requests
+
+from deliveroo_crawler.rate_limit import HostRateLimiter
+
+# Responses and errors that are worth another attempt
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_EXCEPTIONS = (requests.Timeout, requests.ConnectionError)
+
+
+class FetchError(Exception):
+    def __init__(self, url: str, status_code: int | None, reason: str) -> None:
+        super().__init__(f"{url} - {reason} [{status_code}]")
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 4, base_delay: float = 1.0, max_delay: float = 60.0,
+                 statuses: frozenset = RETRY_STATUSES) -> None:
+        """
+        :param attempts: Total number of attempts per URL, including the first one
+        :param base_delay: Back-off before the first retry, doubled on every further retry
+        :param max_delay: Upper bound on a single back-off (also caps Retry-After)
+        :param statuses: HTTP statuses that are retried
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.statuses = statuses
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Back-off before retry number ``attempt`` (1-based), honouring Retry-After."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter keeps retrying workers from synchronising
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` consecutive transient failures and holds every caller
+    in :meth:`wait` for ``cooldown`` seconds, so the whole pool pauses during an outage.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+        self.__failures = 0
+        self.__open_until = 0.0
+        self.__lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self.__open_until
+
+    def remaining(self) -> float:
+        return max(self.__open_until - time.monotonic(), 0.0)
+
+    def wait(self) -> None:
+        while (remaining := self.remaining()) > 0:
+            time.sleep(remaining)
+
+    async def wait_async(self) -> None:
+        while (remaining := self.remaining()) > 0:
+            await asyncio.sleep(remaining)
+
+    def record_success(self) -> None:
+        with self.__lock:
+            self.__failures = 0
+
+    def record_failure(self) -> None:
+        with self.__lock:
+            self.__failures += 1
+            if self.__failures >= self.threshold and not self.is_open:
+                self.__open_until = time.monotonic() + self.cooldown
+                # Half-open afterwards: a single further failure trips it again
+                self.__failures = self.threshold - 1
+                logging.warning(f"Circuit open for {self.cooldown:.0f}s after "
+                                f"{self.threshold} consecutive failures")
+
+
+class HostCircuitBreakers:
+    """One :class:`CircuitBreaker` per domain."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+        self.__breakers = {}
+        self.__lock = threading.Lock()
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        domain = HostRateLimiter.domain(url)
+        with self.__lock:
+            if domain not in self.__breakers:
+                self.__breakers[domain] = CircuitBreaker(self.threshold, self.cooldown)
+            return self.__breakers[domain]
+
+
+def get_with_retry(transport, url: str, policy: RetryPolicy, breakers: HostCircuitBreakers,
+                   rate_limiter: HostRateLimiter = None, ok_statuses: tuple = (200,),
+                   **kwargs) -> requests.Response:
+    """
+    GET ``url`` through ``transport``, retrying transient failures with exponential back-off.
+
+    :return: The first response with a status in ``ok_statuses``
+    :raises FetchError: On a non-retryable status or once all attempts are used up
+    """
+    breaker = breakers.breaker(url)
+    for attempt in range(1, policy.attempts + 1):
+        breaker.wait()
+        if rate_limiter is not None:
+            rate_limiter.acquire(url)
+
+        retry_after = None
+        try:
+            raw = transport.get(url, **kwargs)
+        except RETRY_EXCEPTIONS as e:
+            error = FetchError(url, None, type(e).__name__)
+        else:
+            if raw.status_code in ok_statuses:
+                breaker.record_success()
+                return raw
+            error = FetchError(url, raw.status_code, raw.reason)
+            if raw.status_code not in policy.statuses:
+                raise error
+            retry_after = parse_retry_after(raw.headers.get('retry-after'))
+
+        breaker.record_failure()
+        if attempt < policy.attempts:
+            delay = policy.delay(attempt, retry_after)
+            logging.debug(f"{error} - retry {attempt} in {delay:.1f}s")
+            time.sleep(delay)
+
+    raise error
@@ -0,0 +1,191 @@
+from typing import Callable, NamedTuple
+
+from deliveroo_crawler.normalise import parse_kcal, price_currency, price_minor
+
+# Raised while walking a path through missing keys, null parents or failed conversions
+_MISSING = (KeyError, IndexError, TypeError, ValueError)
+
+
+class Field(NamedTuple):
+    """
+    One extracted value.
+
+    :param path: Keys walked from the object the schema is applied to
+    :param default: Returned when the path is missing or the conversion fails
+    :param type: Optional conversion applied to the value found
+    """
+    path: tuple
+    default: object = None
+    type: Callable = None
+
+
+# Relative to props.initialState.menuPage.menu.meta
+RESTAURANT_FIELDS = {
+    'name': Field(('restaurant', 'name')),
+    'address': Field(('restaurant', 'location', 'address', 'address1')),
+    'lat': Field(('customerLocation', 'lat')),
+    'lon': Field(('customerLocation', 'lon')),
+    'city': Field(('customerLocation', 'city')),
+    'neighborhood': Field(('customerLocation', 'neighborhood')),
+    'postcode': Field(('customerLocation', 'postcode')),
+    'cityId': Field(('customerLocation', 'cityId')),
+    'zoneId': Field(('customerLocation', 'zoneId')),
+    'geohash': Field(('customerLocation', 'geohash')),
+}
+
+# Relative to one entry of meta.items
+MENU_ITEM_FIELDS = {
+    'item_id': Field(('id',), type=str),
+    'name': Field(('name',)),
+    'description': Field(('description',)),
+    'price': Field(('price', 'formatted')),
+    'nutritional_info': Field(('nutritionalInfo', 'energyFormatted')),
+    'image_url': Field(('image', 'url')),
+    # Typed values next to the display strings
+    'price_minor': Field(('price',), type=price_minor),
+    'currency': Field(('price',), type=price_currency),
+    'kcal': Field(('nutritionalInfo', 'energyFormatted'), type=parse_kcal),
+}
+
+
+class Record:
+    """
+    Base of the ``__slots__`` records built by :func:`record_type`.
+
+    A record has no per-instance ``__dict__``, which makes it a fraction of the size of the
+    equivalent dict, but it keeps the read side of the dict interface (``[]``, ``get``, ``keys``,
+    ``items``, iteration over keys) so code written against dicts works unchanged.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, name: str):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name: str, value) -> None:
+        if name not in self.__slots__:
+            raise KeyError(name)
+        setattr(self, name, value)
+
+    def get(self, name: str, default=None):
+        return getattr(self, name, default) if name in self.__slots__ else default
+
+    def keys(self) -> tuple:
+        return self.__slots__
+
+    def values(self) -> list:
+        return [getattr(self, name) for name in self.__slots__]
+
+    def items(self) -> list:
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def as_dict(self) -> dict:
+        return dict(self.items())
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__slots__
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({", ".join(f"{name}={value!r}" for name, value in self.items())})'
+
+    def __reduce__(self):
+        # Record types are made at runtime, so pickle by name and fields (e.g. back from a worker process)
+        return _rebuild, (type(self).__name__, self.__slots__, tuple(self.values()))
+
+
+_record_types = {}
+
+
+def record_type(name: str, fields) -> type:
+    """The :class:`Record` subclass with slots ``fields``, created once per name and field tuple."""
+    fields = tuple(fields)
+    key = (name, fields)
+    if key not in _record_types:
+        namespace = {}
+        args = ''.join(f', {field}' for field in fields)
+        body = ''.join(f'\n    self.{field} = {field}' for field in fields) or '\n    pass'
+        exec(f'def __init__(self{args}):{body}', namespace)
+        _record_types[key] = type(name, (Record,), {'__slots__': fields, '__init__': namespace['__init__']})
+    return _record_types[key]
+
+
+def _rebuild(name: str, fields: tuple, values: tuple) -> Record:
+    return record_type(name, fields)(*values)
+
+
+class Schema:
+    """
+    Named fields compiled into a single function that extracts them all from a decoded object.
+
+    The accessor is generated once, so applying a schema is straight-line subscripting with no
+    per-field loops or lookups. :meth:`project` keeps only the fields a run needs.
+
+    :param fields: ``{name: Field}``, in output order
+    :param record: Build instances of a :func:`record_type` of this name instead of dicts
+    """
+
+    def __init__(self, fields: dict, record: str = None) -> None:
+        self.fields = dict(fields)
+        self.record = record
+        self.__extract = self.__compile()
+
+    def __compile(self) -> Callable:
+        namespace = {'_MISSING': _MISSING}
+        lines = ['def extract(obj):']
+        for i, field in enumerate(self.fields.values()):
+            namespace[f'_default{i}'] = field.default
+            lines += ['    try:',
+                      f'        v{i} = obj' + ''.join(f'[{key!r}]' for key in field.path)]
+            if field.type is not None:
+                # Nulls are kept as they are, only values found are converted
+                namespace[f'_type{i}'] = field.type
+                lines.append(f'        v{i} = None if v{i} is None else _type{i}(v{i})')
+            lines += ['    except _MISSING:',
+                      f'        v{i} = _default{i}']
+        if self.record is not None:
+            namespace['_Record'] = record_type(self.record, self.fields)
+            lines.append('    return _Record(' + ', '.join(f'v{i}' for i in range(len(self.fields))) + ')')
+        else:
+            lines.append('    return {' + ', '.join(f'{name!r}: v{i}' for i, name in enumerate(self.fields)) + '}')
+
+        exec('\n'.join(lines), namespace)
+        return namespace['extract']
+
+    def __call__(self, obj) -> dict | Record:
+        return self.__extract(obj)
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.fields
+
+    def project(self, names) -> 'Schema':
+        """A schema with only ``names`` (those this schema has), keeping this schema's order."""
+        names = set(names)
+        return Schema({name: field for name, field in self.fields.items() if name in names}, self.record)
+
+    def with_defaults(self, **defaults) -> 'Schema':
+        return Schema({name: field._replace(default=defaults[name]) if name in defaults else field
+                       for name, field in self.fields.items()}, self.record)
+
+    def with_types(self, **types) -> 'Schema':
+        return Schema({name: field._replace(type=types[name]) if name in types else field
+                       for name, field in self.fields.items()}, self.record)
+
+    def as_records(self, name: str) -> 'Schema':
+        """The same fields, extracted into ``__slots__`` records called ``name``."""
+        return Schema(self.fields, name)
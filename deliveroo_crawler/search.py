@@ -0,0 +1,89 @@
+"""
+Full-text search over the menu items of a crawl DB, through its ``menu_fts`` index.
+
+    python -m deliveroo_crawler.search deliveroo_london.db "halloumi wrap" --city London
+    python -m deliveroo_crawler.search deliveroo_london.db --rebuild
+"""
+import argparse
+import sqlite3
+
+from deliveroo_crawler.storage import create_menu_search, open_read_only, rebuild_menu_search
+
+# Matches in an item's name count for more than in its description
+NAME_WEIGHT = 5.0
+DESCRIPTION_WEIGHT = 1.0
+
+RESULT_COLUMNS = ('rank', 'url_key', 'restaurant', 'address', 'neighborhood', 'city', 'postcode', 'lat', 'lon',
+                  'item_id', 'name', 'description', 'price')
+
+SEARCH_MENU = f'''SELECT bm25(menu_fts, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}) AS rank,
+                         r.url_key, r.name, r.address, r.neighborhood, r.city, r.postcode, r.lat, r.lon,
+                         m.item_id, m.name, m.description, m.price
+                  FROM menu_fts
+                  JOIN menu AS m ON m.id = menu_fts.rowid
+                  JOIN restaurant AS r ON r.id = m.restaurant_id
+                  WHERE menu_fts MATCH ? {{where}}
+                  ORDER BY rank
+                  LIMIT ?'''
+
+
+def match_query(text: str) -> str:
+    """FTS5 query matching items with every word of ``text``, read as plain words rather than query syntax."""
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def search_menu(conn: sqlite3.Connection, text: str, limit: int = 20, city: str = None,
+                neighborhood: str = None, raw: bool = False) -> list:
+    """
+    Menu items matching ``text``, best first, with their restaurant and its location.
+
+    :param text: Words every hit has in its name or description
+    :param city: Only restaurants in this city
+    :param neighborhood: Only restaurants in this neighborhood
+    :param raw: ``text`` is an FTS5 query (``"halloumi wrap" OR falafel*``) rather than plain words
+    :return: Dicts with :data:`RESULT_COLUMNS`, ``rank`` the lower the better
+    """
+    query = text if raw else match_query(text)
+    if not query:
+        return []
+    where = ''
+    params = [query]
+    for column, value in (('city', city), ('neighborhood', neighborhood)):
+        if value is not None:
+            where += f' AND r.{column} = ?'
+            params.append(value)
+    rows = conn.execute(SEARCH_MENU.format(where=where), (*params, limit))
+    return [dict(zip(RESULT_COLUMNS, row)) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('db', help='Crawl DB, e.g. deliveroo_london.db')
+    parser.add_argument('query', nargs='?', help='Words to find in menu item names and descriptions')
+    parser.add_argument('--city', help='Only restaurants in this city')
+    parser.add_argument('--neighborhood', help='Only restaurants in this neighborhood')
+    parser.add_argument('--limit', type=int, default=20, help='Most hits shown')
+    parser.add_argument('--raw', action='store_true', help='The query is FTS5 syntax, e.g. \'"halloumi wrap" OR falafel*\'')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index from the stored menus first')
+    args = parser.parse_args()
+    if args.query is None and not args.rebuild:
+        parser.error('a query or --rebuild is needed')
+
+    if args.rebuild:
+        # Only the index is written, migrating the rest of the DB is left to the crawl and deliveroo_crawler.storage
+        conn = sqlite3.connect(args.db)
+        with conn:
+            if not create_menu_search(conn):
+                raise SystemExit(f"{args.db}: the menu search index is not available, see the warning above")
+            print(f"{rebuild_menu_search(conn)} menu items indexed")
+        conn.close()
+
+    if args.query is not None:
+        with open_read_only(args.db, 'menu_fts') as conn:
+            for hit in search_menu(conn, args.query, args.limit, args.city, args.neighborhood, args.raw):
+                print(f"{hit['name']} ({hit['price'] or '-'}) - {hit['restaurant']}, "
+                      f"{hit['neighborhood']}, {hit['postcode']}")
+
+
+if __name__ == '__main__':
+    main()
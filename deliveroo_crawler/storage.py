@@ -0,0 +1,684 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from itertools import islice
+from pathlib import Path
+
+from deliveroo_crawler.normalise import MENU_COLUMNS, ensure_menu_columns
+from deliveroo_crawler.urls import restaurant_key
+
+# Column order of the restaurant and menu tables
+RESTAURANT_COLUMNS = ('name', 'address', 'neighborhood', 'lat', 'lon', 'city', 'postcode', 'cityId', 'zoneId', 'geohash')
+MENU_ITEM_COLUMNS = ('item_id', 'name', 'description', 'price', 'image_url', *MENU_COLUMNS)
+
+# Bumped by migrations, stored in PRAGMA user_version
+SCHEMA_VERSION = 3
+
+# Kinds of menu_change rows
+ADDED, CHANGED, REMOVED = 'added', 'changed', 'removed'
+# An item whose stored value of one of these differs is recorded as changed
+CHANGE_COLUMNS = ('name', 'description', 'price', 'image_url')
+
+# Restaurants are keyed on urls.restaurant_key of their menu URL (market host + city/area/slug path),
+# menu items on (restaurant, Deliveroo item id). Rewriting a restaurant updates its row in place;
+# a column left out of a projection keeps its stored value, crawled_at is that of the latest write.
+UPSERT_RESTAURANT = (
+    f'INSERT INTO restaurant (url_key, {", ".join(RESTAURANT_COLUMNS)}, crawled_at) '
+    f'VALUES (?, {", ".join("?" * len(RESTAURANT_COLUMNS))}, ?) '
+    f'ON CONFLICT (url_key) DO UPDATE SET '
+    f'{", ".join(f"{column} = COALESCE(excluded.{column}, {column})" for column in RESTAURANT_COLUMNS)}, '
+    f'crawled_at = excluded.crawled_at '
+    f'RETURNING id'
+)
+UPSERT_MENU_ITEM = (
+    f'INSERT INTO menu (restaurant_id, {", ".join(MENU_ITEM_COLUMNS)}) '
+    f'VALUES (?, {", ".join("?" * len(MENU_ITEM_COLUMNS))}) '
+    f'ON CONFLICT (restaurant_id, item_id) DO UPDATE SET '
+    f'{", ".join(f"{column} = COALESCE(excluded.{column}, {column})" for column in MENU_ITEM_COLUMNS[1:])}'
+)
+# Menu items are written, diffed and handed to the sinks this many at a time, so memory stays flat however long
+# a menu is; the ids already written go to a temp table, from which the items gone from the menu are found
+MENU_CHUNK_SIZE = 1000
+CREATE_WRITTEN_ITEMS = 'CREATE TEMP TABLE IF NOT EXISTS written_item (item_id TEXT PRIMARY KEY)'
+INSERT_WRITTEN_ITEM = 'INSERT OR IGNORE INTO temp.written_item (item_id) VALUES (?)'
+INSERT_REMOVED_ITEMS = (
+    f'INSERT INTO menu_change (restaurant_id, crawled_at, change, {", ".join(MENU_ITEM_COLUMNS)}) '
+    f'SELECT restaurant_id, ?, ?, {", ".join(MENU_ITEM_COLUMNS)} FROM menu '
+    f'WHERE restaurant_id = ? AND item_id NOT IN (SELECT item_id FROM temp.written_item) ORDER BY id'
+)
+DELETE_STALE_ITEMS = ('DELETE FROM menu '
+                      'WHERE restaurant_id = ? AND item_id NOT IN (SELECT item_id FROM temp.written_item)')
+# A restaurant keyed by migrate_natural_keys() on its name and address takes the URL key of its first recrawl
+HAS_LEGACY_KEYS = "SELECT 1 FROM restaurant WHERE url_key >= 'legacy:' AND url_key < 'legacy;' LIMIT 1"
+ADOPT_LEGACY_KEY = ('UPDATE restaurant SET url_key = ? WHERE url_key = ? '
+                    'AND NOT EXISTS (SELECT 1 FROM restaurant WHERE url_key = ?) RETURNING id')
+REKEY_MENU_ITEM = 'UPDATE OR IGNORE menu SET item_id = ? WHERE restaurant_id = ? AND item_id = ?'
+REKEY_MENU_CHANGE = 'UPDATE menu_change SET item_id = ? WHERE restaurant_id = ? AND item_id = ?'
+INSERT_LISTING = 'INSERT OR IGNORE INTO restaurant_listing (restaurant_id, url) VALUES (?, ?)'
+# Stored versions of the items of one chunk, given the JSON list of their ids
+SELECT_MENU_ITEMS = (f'SELECT {", ".join(MENU_ITEM_COLUMNS)} FROM menu '
+                     f'WHERE restaurant_id = ? AND item_id IN (SELECT value FROM json_each(?))')
+INSERT_MENU_CHANGE = (
+    f'INSERT INTO menu_change (restaurant_id, crawled_at, change, {", ".join(MENU_ITEM_COLUMNS)}) '
+    f'VALUES (?, ?, ?, {", ".join("?" * len(MENU_ITEM_COLUMNS))})'
+)
+
+# Full-text index of menu item names and descriptions, reading the text from the menu table itself.
+# The triggers keep it in step with every insert, upsert and delete of a menu row.
+CREATE_MENU_SEARCH = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS menu_fts USING fts5("
+    "name, description, content='menu', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    '''CREATE TRIGGER IF NOT EXISTS menu_fts_insert AFTER INSERT ON menu BEGIN
+           INSERT INTO menu_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS menu_fts_delete AFTER DELETE ON menu BEGIN
+           INSERT INTO menu_fts (menu_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+       END''',
+    # Rewriting an unchanged item (every recrawl) leaves the index alone
+    '''CREATE TRIGGER IF NOT EXISTS menu_fts_update AFTER UPDATE OF name, description ON menu
+       WHEN old.name IS NOT new.name OR old.description IS NOT new.description BEGIN
+           INSERT INTO menu_fts (menu_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+           INSERT INTO menu_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+       END''',
+)
+
+# Tells the writer thread to flush and exit
+_STOP = object()
+
+# Batches the writer queue holds by default before put() blocks the workers; short menus wait there whole
+QUEUED_BATCHES = 4
+
+# Chunks of a long menu a worker decodes ahead of the writer thread
+HANDOFF_CHUNKS = 2
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    """Create the tables and indexes, migrating a DB written by an older version first."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS restaurant (
+                        id INTEGER PRIMARY KEY,
+                        url_key TEXT,
+                        name TEXT,
+                        address TEXT,
+                        neighborhood TEXT,
+                        lat REAL,
+                        lon REAL,
+                        city TEXT,
+                        postcode TEXT,
+                        cityId INTEGER,
+                        zoneId INTEGER,
+                        geohash TEXT,
+                        crawled_at REAL
+                    )''')
+    # DBs from before it get the column; until recrawled, their restaurants' crawl time is unknown
+    if 'crawled_at' not in {row[1] for row in conn.execute('PRAGMA table_info(restaurant)')}:
+        conn.execute('ALTER TABLE restaurant ADD COLUMN crawled_at REAL')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS menu (
+                        id INTEGER PRIMARY KEY,
+                        restaurant_id INTEGER,
+                        item_id TEXT,
+                        name TEXT,
+                        description TEXT,
+                        price TEXT,
+                        image_url TEXT,
+                        price_minor INTEGER,
+                        currency TEXT,
+                        kcal INTEGER,
+                        FOREIGN KEY (restaurant_id) REFERENCES restaurant (id)
+                    )''')
+    # DBs from before the typed columns get them added, normalise.backfill_prices() fills old rows
+    ensure_menu_columns(conn)
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS restaurant_listing (
+                        restaurant_id INTEGER,
+                        url TEXT,
+                        FOREIGN KEY (restaurant_id) REFERENCES restaurant (id)
+                    )''')
+
+    # One row per item added, changed or removed by a crawl, holding the item as it was from then on
+    conn.execute('''CREATE TABLE IF NOT EXISTS menu_change (
+                        id INTEGER PRIMARY KEY,
+                        restaurant_id INTEGER,
+                        crawled_at REAL,
+                        change TEXT,
+                        item_id TEXT,
+                        name TEXT,
+                        description TEXT,
+                        price TEXT,
+                        image_url TEXT,
+                        price_minor INTEGER,
+                        currency TEXT,
+                        kcal INTEGER,
+                        FOREIGN KEY (restaurant_id) REFERENCES restaurant (id)
+                    )''')
+
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version < 1:
+        migrate_natural_keys(conn)
+    if version < 2:
+        seed_menu_history(conn)
+
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS restaurant_url_key ON restaurant (url_key)')
+    conn.execute('CREATE INDEX IF NOT EXISTS restaurant_name ON restaurant (name)')
+    conn.execute('CREATE INDEX IF NOT EXISTS restaurant_city_neighborhood ON restaurant (city, neighborhood)')
+    # Also serves every lookup of a restaurant's menu
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS menu_restaurant_item ON menu (restaurant_id, item_id)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS restaurant_listing_restaurant_url '
+                 'ON restaurant_listing (restaurant_id, url)')
+    conn.execute('CREATE INDEX IF NOT EXISTS restaurant_listing_url ON restaurant_listing (url)')
+    conn.execute('CREATE INDEX IF NOT EXISTS menu_change_restaurant_item '
+                 'ON menu_change (restaurant_id, item_id, crawled_at)')
+
+    if create_menu_search(conn) and version < 3:
+        # Index the menus stored before it existed
+        rebuild_menu_search(conn)
+        conn.execute('PRAGMA user_version = 3')
+
+
+def open_read_only(db_name: str, table: str) -> sqlite3.Connection:
+    """
+    Open a crawl DB for reading only, e.g. from a query CLI; migrating it is left to the crawl and :func:`main`.
+
+    :raises SystemExit: If the DB has no ``table`` yet
+    """
+    conn = sqlite3.connect(Path(db_name).resolve().as_uri() + '?mode=ro', uri=True)
+    if conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (table,)).fetchone() is None:
+        conn.close()
+        raise SystemExit(f"{db_name} has no {table} table yet, "
+                         f"migrate it with: python -m deliveroo_crawler.storage {db_name}")
+    return conn
+
+
+def create_menu_search(conn: sqlite3.Connection) -> bool:
+    """
+    Create the ``menu_fts`` index and its triggers.
+
+    :return: False if this SQLite has no FTS5, in which case menus are stored without the index
+    """
+    try:
+        for statement in CREATE_MENU_SEARCH:
+            conn.execute(statement)
+    except sqlite3.OperationalError as e:
+        logging.warning(f"Menu search index not available: {e}")
+        return False
+    return True
+
+
+def rebuild_menu_search(conn: sqlite3.Connection) -> int:
+    """
+    Rebuild ``menu_fts`` from the menu table, e.g. for a DB written without it.
+
+    :return: Number of menu items indexed
+    """
+    conn.execute("INSERT INTO menu_fts (menu_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO menu_fts (menu_fts) VALUES ('optimize')")
+    return conn.execute('SELECT COUNT(*) FROM menu').fetchone()[0]
+
+
+def migrate_natural_keys(conn: sqlite3.Connection) -> dict:
+    """
+    Give an older DB its natural keys and drop the duplicates every rerun used to insert.
+
+    Restaurants get the key of a listing URL that pointed at them, or, for rows written before
+    listings were recorded, ``legacy:<name>|<address>|<postcode>``. The most recently written row
+    of each key is kept with its menu; menu items without an id are keyed on their name.
+
+    :return: Number of ``restaurants`` and ``menu_items`` removed
+    """
+    for table, column in (('restaurant', 'url_key'), ('menu', 'item_id')):
+        if column not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} TEXT')
+
+    listed = conn.execute('''SELECT restaurant_id, MIN(url) FROM restaurant_listing
+                             WHERE restaurant_id IN (SELECT id FROM restaurant WHERE url_key IS NULL)
+                             GROUP BY restaurant_id''').fetchall()
+    conn.executemany('UPDATE restaurant SET url_key = ? WHERE id = ?',
+                     [(restaurant_key(url), restaurant_id) for restaurant_id, url in listed])
+    conn.execute('''UPDATE restaurant SET url_key = 'legacy:' || IFNULL(name, '') || '|' || IFNULL(address, '')
+                    || '|' || IFNULL(postcode, '') WHERE url_key IS NULL''')
+    conn.execute('UPDATE menu SET item_id = name WHERE item_id IS NULL')
+
+    restaurants = conn.execute('SELECT COUNT(*) FROM restaurant').fetchone()[0]
+    menu_items = conn.execute('SELECT COUNT(*) FROM menu').fetchone()[0]
+
+    conn.execute('CREATE TEMP TABLE survivor AS SELECT url_key, MAX(id) AS id FROM restaurant GROUP BY url_key')
+    conn.execute('''UPDATE restaurant_listing SET restaurant_id = (
+                        SELECT survivor.id FROM restaurant JOIN survivor USING (url_key)
+                        WHERE restaurant.id = restaurant_listing.restaurant_id)
+                    WHERE restaurant_id IN (SELECT id FROM restaurant)''')
+    conn.execute('''DELETE FROM restaurant_listing WHERE rowid NOT IN (
+                        SELECT MIN(rowid) FROM restaurant_listing GROUP BY restaurant_id, url)''')
+    conn.execute('DELETE FROM menu WHERE restaurant_id NOT IN (SELECT id FROM survivor)')
+    conn.execute('DELETE FROM restaurant WHERE id NOT IN (SELECT id FROM survivor)')
+    conn.execute('DELETE FROM menu WHERE id NOT IN (SELECT MAX(id) FROM menu GROUP BY restaurant_id, item_id)')
+    conn.execute('DROP TABLE temp.survivor')
+    conn.execute('PRAGMA user_version = 1')
+
+    removed = {
+        'restaurants': restaurants - conn.execute('SELECT COUNT(*) FROM restaurant').fetchone()[0],
+        'menu_items': menu_items - conn.execute('SELECT COUNT(*) FROM menu').fetchone()[0],
+    }
+    if any(removed.values()):
+        logging.info(f"Migrated to natural keys, removed {removed['restaurants']} duplicate restaurants "
+                     f"and {removed['menu_items']} duplicate menu items")
+    return removed
+
+
+def seed_menu_history(conn: sqlite3.Connection) -> int:
+    """
+    Start the change history of a DB written before it was kept: every stored item is recorded
+    as added now, the earliest time its menu can be rebuilt at.
+
+    :return: Number of items recorded
+    """
+    seeded = conn.execute(f'''INSERT INTO menu_change (restaurant_id, crawled_at, change, {", ".join(MENU_ITEM_COLUMNS)})
+                              SELECT restaurant_id, ?, ?, {", ".join(MENU_ITEM_COLUMNS)} FROM menu
+                              WHERE restaurant_id NOT IN (SELECT restaurant_id FROM menu_change)''',
+                          (time.time(), ADDED)).rowcount
+    conn.execute('PRAGMA user_version = 2')
+    if seeded:
+        logging.info(f"Started the menu history with the {seeded} stored menu items")
+    return seeded
+
+
+def menu_changes(restaurant_id: int, stored: dict, menu_rows: dict, crawled_at: float) -> tuple:
+    """
+    Diff one restaurant's freshly extracted menu against its stored version.
+
+    :param stored: ``{item_id: row}`` of the stored menu, rows in :data:`MENU_ITEM_COLUMNS` order
+    :param menu_rows: ``{item_id: row}`` just extracted; a None value keeps the stored one, as the upsert does
+    :return: ``(change rows, menu as stored after this crawl)``
+    """
+    compared = [MENU_ITEM_COLUMNS.index(column) for column in CHANGE_COLUMNS]
+    changes = []
+    current = {}
+    for item_id, row in menu_rows.items():
+        previous = stored.get(item_id)
+        if previous is None:
+            changes.append((restaurant_id, crawled_at, ADDED, *row))
+        else:
+            row = tuple(old if new is None else new for new, old in zip(row, previous))
+            if any(row[i] != previous[i] for i in compared):
+                changes.append((restaurant_id, crawled_at, CHANGED, *row))
+        current[item_id] = row
+    changes.extend((restaurant_id, crawled_at, REMOVED, *row)
+                   for item_id, row in stored.items() if item_id not in current)
+    return changes, current
+
+
+def item_key(item) -> str:
+    """Natural key of a menu item within its restaurant: Deliveroo's item id, else its name."""
+    return item.get('item_id') or item.get('name')
+
+
+def legacy_key(restaurant_details: dict) -> str:
+    """Key :func:`migrate_natural_keys` gave a restaurant it could not tie to a listing URL."""
+    return 'legacy:' + '|'.join('' if restaurant_details.get(column) is None else str(restaurant_details[column])
+                                for column in ('name', 'address', 'postcode'))
+
+
+def crawl_times(conn: sqlite3.Connection) -> dict:
+    """``{url_key: crawled_at}`` of every stored restaurant."""
+    return dict(conn.execute('SELECT url_key, crawled_at FROM restaurant WHERE crawled_at IS NOT NULL'))
+
+
+def insert_restaurant(conn: sqlite3.Connection, url: str, restaurant_details: dict, menu_items, listed_urls: list,
+                      crawled_at: float = None, on_items=None) -> int:
+    """
+    Upsert one restaurant with its menu and listings; the caller owns the transaction.
+
+    ``menu_items`` may be a generator, it is consumed :data:`MENU_CHUNK_SIZE` items at a time:
+    each chunk is diffed against the stored versions of just its items, then upserted with one
+    ``executemany``. Items gone from the menu are deleted at the end, so rewriting a restaurant
+    leaves exactly its current menu. Fields missing from the details or items (e.g. left out of
+    a projection) are stored as NULL.
+
+    Only the items added, changed or removed since the stored menu go into ``menu_change``,
+    so the history grows with menu churn rather than with the number of crawls.
+
+    A restaurant still under the :func:`legacy_key` of a migrated DB is taken over by the first
+    crawl of its URL, with its menu items and history moved from their name to their item id.
+
+    :param crawled_at: Crawl time stored on the restaurant and its changes, now if None
+    :param on_items: Called with each chunk of items once it is written
+    :return: Restaurant id
+    """
+    crawled_at = time.time() if crawled_at is None else crawled_at
+    url_key = restaurant_key(url)
+    adopted = conn.execute(HAS_LEGACY_KEYS).fetchone() is not None and conn.execute(
+        ADOPT_LEGACY_KEY, (url_key, legacy_key(restaurant_details), url_key)).fetchone() is not None
+    restaurant_id = conn.execute(UPSERT_RESTAURANT, (
+        url_key, *(restaurant_details.get(column) for column in RESTAURANT_COLUMNS), crawled_at
+    )).fetchone()[0]
+
+    conn.execute(CREATE_WRITTEN_ITEMS)
+    conn.execute('DELETE FROM temp.written_item')
+    items = iter(menu_items)
+    written = False
+    while chunk := list(islice(items, MENU_CHUNK_SIZE)):
+        # Keyed on the item, the last of duplicates wins as it does in the upsert
+        rows = {}
+        for item in chunk:
+            item_id = item_key(item)
+            rows[item_id] = (item_id, *(item.get(column) for column in MENU_ITEM_COLUMNS[1:]))
+        if adopted:
+            # The migration keyed items without an id on their name
+            rekeyed = [(item_id, restaurant_id, row[1]) for item_id, row in rows.items()
+                       if row[1] not in (None, item_id)]
+            conn.executemany(REKEY_MENU_ITEM, rekeyed)
+            conn.executemany(REKEY_MENU_CHANGE, rekeyed)
+
+        stored = {row[0]: row for row in conn.execute(SELECT_MENU_ITEMS, (restaurant_id, json.dumps(list(rows))))}
+        changes, _ = menu_changes(restaurant_id, stored, rows, crawled_at)
+        conn.executemany(INSERT_MENU_CHANGE, changes)
+        conn.executemany(UPSERT_MENU_ITEM, ((restaurant_id, *row) for row in rows.values()))
+        conn.executemany(INSERT_WRITTEN_ITEM, ((item_id,) for item_id in rows))
+        written = True
+        if on_items is not None:
+            on_items(chunk)
+
+    # A run that extracts no menu items leaves the stored menu alone
+    if written:
+        conn.execute(INSERT_REMOVED_ITEMS, (crawled_at, REMOVED, restaurant_id))
+        conn.execute(DELETE_STALE_ITEMS, (restaurant_id,))
+
+    # Attach the restaurant to every borough/zone listing that pointed at it
+    conn.executemany(INSERT_LISTING, ((restaurant_id, listed_url) for listed_url in listed_urls))
+    return restaurant_id
+
+
+def insert_restaurants(conn: sqlite3.Connection, restaurants: list, crawled_at: float = None) -> None:
+    """
+    Upsert ``(url, restaurant_details, menu_items, listed_urls, crawled_at)`` entries with
+    :func:`insert_restaurant`; the caller owns the transaction.
+
+    :param crawled_at: Crawl time of entries whose own is None, now if None
+    """
+    crawled_at = time.time() if crawled_at is None else crawled_at
+    for url, restaurant_details, menu_items, listed_urls, entry_crawled_at in restaurants:
+        insert_restaurant(conn, url, restaurant_details, menu_items, listed_urls,
+                          crawled_at if entry_crawled_at is None else entry_crawled_at)
+
+
+class MenuAborted(Exception):
+    """The worker streaming a menu to the writer could not read the rest of it."""
+
+
+class SQLiteWriter:
+    """
+    Single thread that owns every restaurant/menu write to one SQLite file.
+
+    Workers hand results over with :meth:`put` instead of each opening a connection, so they
+    never contend for the database lock. The schema is set up once, the database runs in WAL
+    mode (readers do not block the writer), and queued restaurants are committed together,
+    once ``batch_size`` are waiting or the oldest has waited ``flush_interval`` seconds.
+    Each restaurant is written under its own savepoint, so one that fails is rolled back alone.
+
+    Menus are handled :data:`MENU_CHUNK_SIZE` items at a time: one no longer than that is queued
+    whole, a longer one is passed from the worker to the writer thread a few chunks at a time
+    while it is written, so memory does not grow with the size of a menu.
+
+    Sinks are extra outputs (e.g. :class:`deliveroo_crawler.export.ParquetSink`) that see every
+    restaurant as it is written: ``write_restaurant(url, restaurant_details, crawled_at)``, then
+    ``write_items(url, items)`` per chunk, ``discard(url)`` if it is rolled back, ``commit()`` once
+    the batch is committed (rows until then have to be held back) and ``close()`` with the writer.
+
+    :param db_name: SQLite file
+    :param batch_size: Restaurants per transaction
+    :param flush_interval: Longest a queued restaurant waits for its commit, in seconds
+    :param queue_size: Restaurants queued before :meth:`put` blocks the worker, ``QUEUED_BATCHES`` batches if None
+    :param sinks: Extra outputs, see above
+    """
+
+    def __init__(self, db_name: str, batch_size: int = 200, flush_interval: float = 1.0,
+                 queue_size: int = None, sinks=()) -> None:
+        self.db_name = db_name
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.__closed = False
+        # Held while queueing, so nothing lands behind the stop marker
+        self.__lock = threading.Lock()
+        self.__queue = queue.Queue(batch_size * QUEUED_BATCHES if queue_size is None else queue_size)
+
+        # Set up on the caller's thread so a broken DB fails the run up front, then owned by the writer thread
+        self.__conn = sqlite3.connect(db_name, timeout=30, check_same_thread=False)
+        try:
+            self.__conn.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.OperationalError as e:
+            # Switching needs a moment with no other transaction open on the file
+            logging.warning(f"{db_name} keeps its journal mode: {e}")
+        # Durable at each checkpoint rather than each commit, which is what WAL is for
+        self.__conn.execute('PRAGMA synchronous=NORMAL')
+        with self.__conn:
+            create_schema(self.__conn)
+
+        self.__thread = threading.Thread(target=self.__run, name=f'sqlite-writer-{db_name}', daemon=True)
+        self.__thread.start()
+
+    def put(self, url: str, restaurant_details: dict, menu_items, listed_urls: list, on_written=None,
+            on_failed=None, crawled_at: float = None) -> None:
+        """
+        Queue a restaurant for the next batch.
+
+        :param url: Menu URL the restaurant was fetched from, its natural key
+        :param menu_items: Items to store; a generator is consumed here, on the worker's thread, and
+            raises to the worker if the menu cannot be read. A menu longer than :data:`MENU_CHUNK_SIZE`
+            keeps this call waiting until the writer thread has written it.
+        :param on_written: Called without arguments on the writer thread once the batch is committed
+        :param on_failed: Called with the error on the writer thread if the restaurant is dropped instead
+        :param crawled_at: Unix time the page was fetched, now if None
+        """
+        crawled_at = time.time() if crawled_at is None else crawled_at
+        # Decoded by the worker, so the writer thread only writes and the queue holds items rather than payloads
+        items = iter(menu_items)
+        chunk = list(islice(items, MENU_CHUNK_SIZE + 1))
+        if len(chunk) <= MENU_CHUNK_SIZE:
+            self.__enqueue((url, restaurant_details, chunk, listed_urls, crawled_at, on_written, on_failed))
+            return
+
+        handoff = queue.Queue(HANDOFF_CHUNKS)
+        self.__enqueue((url, restaurant_details, self.__received(handoff), listed_urls, crawled_at,
+                        on_written, on_failed))
+        try:
+            while chunk:
+                handoff.put(chunk)
+                chunk = list(islice(items, MENU_CHUNK_SIZE))
+        except BaseException as e:
+            handoff.put(MenuAborted(e))
+            raise
+        handoff.put(_STOP)
+
+    def __enqueue(self, entry: tuple) -> None:
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError(f"writer for {self.db_name} is closed")
+            self.__queue.put(entry)
+
+    @staticmethod
+    def __received(handoff: queue.Queue):
+        """Items of a menu a worker is still streaming, ending with it or raising :class:`MenuAborted`."""
+        while (chunk := handoff.get()) is not _STOP:
+            if isinstance(chunk, MenuAborted):
+                raise chunk
+            yield from chunk
+
+    def flush(self) -> None:
+        """Block until everything queued so far is committed."""
+        self.__queue.join()
+
+    def close(self) -> None:
+        """Commit what is queued and stop the writer thread."""
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__queue.put(_STOP)
+        self.__thread.join()
+        for sink in self.sinks:
+            sink.close()
+        logging.info(f"{self.db_name}: {self.written} restaurants written in {self.batches} batches, "
+                     f"{self.dropped} dropped")
+
+    def __run(self) -> None:
+        conn = self.__conn
+        batch = []
+        deadline = None
+        while True:
+            try:
+                timeout = max(0.0, deadline - time.monotonic()) if batch else None
+                entry = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = None
+
+            if entry is not None and entry is not _STOP:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(entry)
+                if len(batch) < self.batch_size and time.monotonic() < deadline:
+                    continue
+
+            if batch:
+                self.__flush(conn, batch)
+                for _ in batch:
+                    self.__queue.task_done()
+                batch = []
+            if entry is _STOP:
+                self.__queue.task_done()
+                break
+
+        conn.close()
+
+    def __flush(self, conn: sqlite3.Connection, batch: list) -> None:
+        written = []
+        failed = []
+        try:
+            with conn:
+                conn.execute('BEGIN')
+                for entry in batch:
+                    error = self.__write(conn, entry)
+                    if error is None:
+                        written.append(entry)
+                    else:
+                        failed.append((entry, error))
+        except sqlite3.Error as e:
+            logging.error(f"SQLite error committing a batch of {len(batch)}, dropped: {e}")
+            settled = {id(entry) for entry, _ in failed}
+            for entry in batch:
+                if id(entry) not in settled:
+                    self.__drop(entry)
+                    failed.append((entry, e))
+            written = []
+
+        self.batches += 1
+        self.written += len(written)
+        self.__sinks('commit')
+        # Only once the transaction is over, the callbacks may write to the same file
+        for entry in written:
+            self.__notify(entry[5])
+        for entry, error in failed:
+            # A menu the worker could not read is raised to it in put(), which fails the URL itself
+            if not isinstance(error, MenuAborted):
+                self.dropped += 1
+                self.__notify(entry[6], error)
+
+    def __write(self, conn: sqlite3.Connection, entry: tuple) -> Exception | None:
+        """Write one restaurant under a savepoint; the error if it is rolled back."""
+        url, restaurant_details, menu_items, listed_urls, crawled_at = entry[:5]
+        conn.execute('SAVEPOINT restaurant')
+        try:
+            self.__sinks('write_restaurant', url, restaurant_details, crawled_at)
+            insert_restaurant(conn, url, restaurant_details, menu_items, listed_urls, crawled_at,
+                              on_items=lambda chunk: self.__sinks('write_items', url, chunk))
+        except MenuAborted as e:
+            conn.execute('ROLLBACK TO restaurant')
+            self.__sinks('discard', url)
+            return e
+        except sqlite3.Error as e:
+            # One bad restaurant should not cost the whole batch
+            conn.execute('ROLLBACK TO restaurant')
+            logging.error(f"SQLite error, dropped {url}: {e}")
+            self.__drop(entry)
+            return e
+        finally:
+            conn.execute('RELEASE restaurant')
+        return None
+
+    def __drop(self, entry: tuple) -> None:
+        # A worker still streaming the menu waits for the rest of it to be taken
+        try:
+            for _ in entry[2]:
+                pass
+        except MenuAborted:
+            pass
+        self.__sinks('discard', entry[0])
+
+    def __sinks(self, method: str, *args) -> None:
+        for sink in self.sinks:
+            try:
+                getattr(sink, method)(*args)
+            except Exception as e:
+                logging.error(f"Error in {type(sink).__name__}.{method}: {e}")
+
+    def __notify(self, callback, *args) -> None:
+        if callback is not None:
+            try:
+                callback(*args)
+            except Exception as e:
+                logging.error(f"Error after writing {self.db_name}: {e}")
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def open_writer(db_name: str, **kwargs) -> SQLiteWriter:
+    """Start the writer for ``db_name`` (or return the running one); kwargs go to :class:`SQLiteWriter`."""
+    key = os.path.abspath(db_name)
+    with _writers_lock:
+        if key not in _writers:
+            _writers[key] = SQLiteWriter(db_name, **kwargs)
+        return _writers[key]
+
+
+def writer_for(db_name: str) -> SQLiteWriter | None:
+    """The running writer for ``db_name``, None outside a run."""
+    return _writers.get(os.path.abspath(db_name))
+
+
+def close_writer(db_name: str) -> None:
+    with _writers_lock:
+        writer = _writers.pop(os.path.abspath(db_name), None)
+    if writer is not None:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate crawl DBs to the current schema, deduplicating '
+                                                 'restaurants and menu items written by earlier reruns.')
+    parser.add_argument('db', nargs='+', help='SQLite files, e.g. deliveroo_london.db deliveroo_dubai_2.db')
+    parser.add_argument('--vacuum', action='store_true', help='Reclaim the space of the removed rows')
+    args = parser.parse_args()
+
+    for db_name in args.db:
+        with sqlite3.connect(db_name) as conn:
+            before = conn.execute('PRAGMA user_version').fetchone()[0]
+            create_schema(conn)
+            after = conn.execute('PRAGMA user_version').fetchone()[0]
+        print(f"{db_name}: schema version {before} -> {after}")
+        if args.vacuum:
+            conn = sqlite3.connect(db_name)
+            conn.execute('VACUUM')
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
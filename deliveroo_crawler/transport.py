@@ -0,0 +1,147 @@
+import itertools
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+
+# Only advertise the encodings urllib3 can decode here (br needs brotli installed)
+HEADERS = {
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/102.0.5005.63 Safari/537.36',
+    **make_headers(accept_encoding=True),
+}
+
+
+class Transport:
+    """
+    Pooled HTTP transport shared by the scrapers and URL collectors.
+
+    Every host gets its own small pool of persistent ``requests.Session`` objects,
+    so TCP and TLS handshakes are paid once per connection rather than once per URL.
+    """
+
+    def __init__(self, pool_size: int = 50, sessions_per_host: int = 1, keep_alive: bool = True,
+                 timeout: float | tuple = (5, 30), headers: dict = None) -> None:
+        """
+        :param pool_size: Maximum number of connections kept open per session
+        :param sessions_per_host: Number of sessions requests to one host are spread over
+        :param keep_alive: Keep connections open between requests
+        :param timeout: Default ``(connect, read)`` timeout in seconds
+        :param headers: Headers sent with every request, defaults to ``HEADERS``
+        """
+        self.pool_size = pool_size
+        self.sessions_per_host = sessions_per_host
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.headers = dict(HEADERS if headers is None else headers)
+        self.headers['connection'] = 'keep-alive' if keep_alive else 'close'
+
+        self.__sessions = {}
+        self.__cycles = {}
+        self.__listeners = []
+        self.__lock = threading.Lock()
+
+    def __new_session(self) -> requests.Session:
+        session = requests.Session()
+        session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def session(self, url: str) -> requests.Session:
+        host = urlsplit(url).netloc
+        with self.__lock:
+            if host not in self.__sessions:
+                self.__sessions[host] = [self.__new_session() for _ in range(self.sessions_per_host)]
+                self.__cycles[host] = itertools.cycle(self.__sessions[host])
+            return next(self.__cycles[host])
+
+    def add_listener(self, listener) -> None:
+        """Call ``listener(url, status_code, elapsed)`` after every request; status is None on errors."""
+        self.__listeners.append(listener)
+
+    def remove_listener(self, listener) -> None:
+        self.__listeners.remove(listener)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.monotonic()
+        try:
+            response = self.session(url).get(url, **kwargs)
+        except requests.RequestException:
+            self.__notify(url, None, time.monotonic() - start)
+            raise
+        self.__notify(url, response.status_code, time.monotonic() - start)
+        return response
+
+    def __notify(self, url: str, status_code: int | None, elapsed: float) -> None:
+        for listener in self.__listeners:
+            listener(url, status_code, elapsed)
+
+    def stats(self) -> dict:
+        """
+        Connection reuse per host, read from the underlying urllib3 pools.
+
+        :return: ``{host: {'requests', 'connections', 'reused', 'reuse_ratio'}}``
+        """
+        with self.__lock:
+            sessions = {host: list(pool) for host, pool in self.__sessions.items()}
+
+        stats = {}
+        for host, host_sessions in sessions.items():
+            num_requests = num_connections = 0
+            for session in host_sessions:
+                pools = session.get_adapter('https://').poolmanager.pools
+                for key in pools.keys():
+                    pool = pools[key]
+                    num_requests += pool.num_requests
+                    num_connections += pool.num_connections
+            reused = max(num_requests - num_connections, 0)
+            stats[host] = {
+                'requests': num_requests,
+                'connections': num_connections,
+                'reused': reused,
+                'reuse_ratio': reused / num_requests if num_requests else 0.0,
+            }
+        return stats
+
+    def log_stats(self) -> None:
+        for host, host_stats in self.stats().items():
+            logging.info(f"{host} - {host_stats['requests']} requests over {host_stats['connections']} "
+                         f"connections ({host_stats['reuse_ratio']:.0%} reused)")
+
+    def close(self) -> None:
+        with self.__lock:
+            for host_sessions in self.__sessions.values():
+                for session in host_sessions:
+                    session.close()
+            self.__sessions.clear()
+            self.__cycles.clear()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def configure(**kwargs) -> Transport:
+    """Replace the shared transport, e.g. ``configure(pool_size=100, timeout=10)``."""
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = Transport(**kwargs)
+        return _transport
+
+
+def get_transport() -> Transport:
+    """Return the transport shared by all scraper and collector instances."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
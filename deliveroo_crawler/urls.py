@@ -0,0 +1,41 @@
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+
+def canonical_url(url: str) -> str:
+    """
+    Strip the per-listing query string (``day``, ``time``, ``postcode``, ``geohash``, ...)
+    and trailing separators from a menu URL, keeping scheme, host and path.
+    """
+    parts = urlsplit(url.strip().rstrip(','))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), '', ''))
+
+
+def restaurant_key(url: str) -> str:
+    """
+    Stable identity of the restaurant behind a menu URL: ``<host>/menu/<city>/<area>/<slug>``.
+
+    Case and percent-encoding differ between listings (``London`` / ``london``,
+    ``king's-cross`` / ``king%27s-cross``), so the path is unquoted and lowercased.
+    """
+    parts = urlsplit(url.strip().rstrip(','))
+    host = parts.netloc.lower()
+    host = host[4:] if host.startswith('www.') else host
+    return host + unquote(parts.path).rstrip('/').lower()
+
+
+def fetch_url(url: str) -> str:
+    """URL actually requested for a listed menu link."""
+    return url.strip().rstrip(',').replace('=ASAP', '=anytime')
+
+
+def group_by_restaurant(urls) -> dict:
+    """
+    Group listed menu URLs by :func:`restaurant_key`, keeping first-seen order.
+
+    :return: ``{key: [url, ...]}`` with every variant that listed the restaurant
+    """
+    groups = {}
+    for url in urls:
+        if url.strip():
+            groups.setdefault(restaurant_key(url), []).append(url)
+    return groups
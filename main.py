@@ -1,8 +1,13 @@
 import os
-from deliveroo_crawler.deliveroo_crawler_wip import DeliverooCrawler
+from deliveroo_crawler.deliveroo_crawler import DeliverooCrawler
+from deliveroo_crawler.output_store import OutputStore
+from deliveroo_crawler.urls import fetch_url, group_by_restaurant
 
 source_directory = 'url_collector/data/boroughs_london'
 data_path = 'crawled_data'
+# Append to one file per borough and table (e.g. crawled_data/camden/menus.csv.zst) instead of one CSV per restaurant
+consolidated_output = False
+compress_output = True
 deliveroo_links = []
 
 for filename in os.listdir(source_directory):
@@ -20,10 +25,23 @@ for filename in os.listdir(source_directory):
             for line in file:
 
                 # Add the line to the deliveroo_links list along with the modified filename
-                deliveroo_links.append((line, end_dir))
+                deliveroo_links.append((line.strip(), end_dir))
 
 if __name__ == '__main__':
+    # The same restaurant is listed under many boroughs, fetch it once and write it to each of them
+    end_dirs = {}
     for link, end_dir in deliveroo_links:
-        # Modify the code according to your needs
-        dc = DeliverooCrawler(link, end_dir)
-        dc.write_to_csv()
\ No newline at end of file
+        end_dirs.setdefault(link, []).append(end_dir)
+
+    store = OutputStore(compress=compress_output) if consolidated_output else None
+    try:
+        for links in group_by_restaurant(end_dirs).values():
+            # Modify the code according to your needs
+            dc = DeliverooCrawler(fetch_url(links[0]), end_dirs[links[0]][0], store=store)
+            borough_dirs = dict.fromkeys(end_dir for link in links for end_dir in end_dirs[link])
+            for end_dir in borough_dirs:
+                dc.set_output_dir(end_dir)
+                dc.write_to_csv()
+    finally:
+        if store is not None:
+            store.close()
\ No newline at end of file
@@ -1,6 +1,10 @@
-import requests
 from bs4 import BeautifulSoup
+import concurrent.futures
+import csv
 import os
+from deliveroo_crawler.deliveroo_crawler_london import circuit_breakers, rate_limiter, retry_policy
+from deliveroo_crawler.listing import discover, fetch_listing
+from deliveroo_crawler.transport import get_transport
 
 london_list = {
 'https://deliveroo.co.uk/restaurants/london/becontree-heath/?geohash=u10j711s4yd6&collection=restaurants&collection=all-restaurants',
@@ -37,25 +41,32 @@ london_list = {
 'https://deliveroo.co.uk/restaurants/london/wandsworth/?geohash=gcpuexwq8zfr&collection=restaurants&collection=all-restaurants'
 }
 
+# Listing page for a geohash cell and the area tiled by discover_urls
+london_listing_template = 'https://deliveroo.co.uk/restaurants/london/mayfair/?geohash={geohash}&collection=all-restaurants'
+london_bbox = (51.28, 51.70, -0.51, 0.33)  # lat_min, lat_max, lon_min, lon_max
+
 
 class URLCollector:
 
     def __init__(self, city_list):
         self.__list = city_list
-        self.__dir = './data'
+        self.__dir = os.path.join(os.path.dirname(__file__), 'data')
         self.__failed_links = []
 
-    def create_directory(self):
+    def create_directory(self, threaded=True):
         if not os.path.exists(self.__dir):
             os.makedirs(self.__dir)
-        self.collect_urls()
+        if threaded:
+            self.collect_urls_concurrent()
+        else:
+            self.collect_urls()
         self.log_failed_links()
 
     def collect_urls(self):
         all_urls = []
         for link in self.__list:
             try:
-                reqs = requests.get(link)
+                reqs = get_transport().get(link)
                 soup = BeautifulSoup(reqs.text, 'html.parser')
 
                 for a_tag in soup.find_all('a'):
@@ -72,12 +83,61 @@ class URLCollector:
             for url in all_urls:
                 f.write(url + "\n")
 
+    def collect_urls_concurrent(self, max_workers=16):
+        # Listing pages are fetched in parallel and each page's links are appended as soon as it completes
+        url_count = 0
+        with open(os.path.join(self.__dir, "london_rest_links_deliveroo.txt"), "w") as f, \
+                open(os.path.join(self.__dir, "listing_pages.csv"), "w", newline='') as stats_file:
+            stats = csv.writer(stats_file)
+            stats.writerow(['listing', 'seconds', 'links', 'status'])
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Same per-host budget, retries and circuit breaker as the menu fetches
+                future_to_link = {executor.submit(fetch_listing, link, rate_limiter, retry_policy, circuit_breakers): link
+                                  for link in self.__list}
+
+                for future in concurrent.futures.as_completed(future_to_link):
+                    link = future_to_link[future]
+                    try:
+                        page = future.result()
+                    except Exception as e:
+                        print(f"Failed to process {link}: {e}")
+                        self.__failed_links.append(link)
+                        continue
+
+                    for url in page['links']:
+                        f.write(url + "\n")
+                    f.flush()
+                    url_count += len(page['links'])
+                    stats.writerow([link, f"{page['seconds']:.3f}", len(page['links']), page['status']])
+                    print(f"{len(page['links'])} links in {page['seconds']:.2f}s from {link}")
+
+        print(f"Collected {url_count} URLs from {len(self.__list) - len(self.__failed_links)} listing pages")
+
+    def discover_urls(self, listing_template, area, start_precision=4, max_precision=6, max_workers=16):
+        # Tiles the city with geohash cells instead of the hand-picked listing URLs, output is deduplicated
+        with open(os.path.join(self.__dir, "london_rest_links_deliveroo.txt"), "w") as f:
+            def write_links(cell, links):
+                for url in links:
+                    f.write(url + "\n")
+                f.flush()
+                print(f"{len(links)} new links from cell {cell}")
+
+            stats = discover(listing_template, area, write_links, start_precision=start_precision,
+                             max_precision=max_precision, max_workers=max_workers, rate_limiter=rate_limiter,
+                             retry_policy=retry_policy, circuit_breakers=circuit_breakers)
+
+        print(f"Discovered {stats['links']} restaurants with {stats['requests']} listing requests "
+              f"({stats['split']} cells split, {stats['pruned']} pruned, {stats['failed']} failed)")
+
     def log_failed_links(self):
         if self.__failed_links:
             with open(os.path.join(self.__dir, "failed_links.txt"), "w") as f:
                 for link in self.__failed_links:
                     f.write(link + "\n")
 
-# Usage
-url_collector = URLCollector(london_list)
-url_collector.create_directory()
\ No newline at end of file
+if __name__ == '__main__':
+    # Usage
+    url_collector = URLCollector(london_list)
+    url_collector.create_directory()
+    # url_collector.discover_urls(london_listing_template, london_bbox)